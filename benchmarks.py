@@ -0,0 +1,211 @@
+# benchmarks.py
+"""Latency of the main data paths at 1k, 100k and 1M logged meals.
+
+Data comes from synth_data.py and is generated once per scale into
+bench_data/<scale>. Each (scale, backend) pair then runs in its own process
+on a fresh copy of that data, with GLUTENY_STORAGE set before anything is
+imported, so no cache or lazily opened store carries over between runs.
+
+Every operation is timed once cold (the first call in the process, which
+pays for loading the logs) and then REPEATS times on different users, from
+which the median and 95th percentile are reported. Deletion is destructive,
+so only DELETIONS users are deleted per run; the background compaction
+each one schedules is timed on its own.
+
+Results are written as JSON for comparing runs, and printed as a table.
+
+Usage:
+    python benchmarks.py run [--scales 1k,100k,1m] [--backends csv,partitioned,sqlite] [--repeats 20] [--output bench_results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import synth_data
+
+# scale -> (users, days); users log about three meals a day
+SCALES = {"1k": (10, 34), "100k": (100, 334), "1m": (1000, 334)}
+# Every storage format synth_data writes is also a backend
+BACKENDS = synth_data.DEFAULT_FORMATS
+DATA_DIR = "bench_data"
+RESULTS_FILE = "bench_results.json"
+REPEATS = 20
+DELETIONS = 3
+SEED = 0
+_MARKER = "counts.json"
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def data_dir(scale):
+    """bench_data/<scale>, generated on first use; returns (path, counts)."""
+    path = os.path.join(DATA_DIR, scale)
+    marker = os.path.join(path, _MARKER)
+    if os.path.exists(marker):
+        with open(marker) as f:
+            # Data from before a format was added is generated again
+            if not set(synth_data.DEFAULT_FORMATS) <= set(json.load(f).get("formats", [])):
+                os.remove(marker)
+    if not os.path.exists(marker):
+        shutil.rmtree(path, ignore_errors=True)
+        users, days = SCALES[scale]
+        print(f"Generating {scale} data ({users} users x {days} days)...", file=sys.stderr)
+        started = time.perf_counter()
+        counts = synth_data.generate(path, users, days, seed=SEED)
+        counts["generate_s"] = round(time.perf_counter() - started, 1)
+        counts["formats"] = synth_data.DEFAULT_FORMATS
+        # Written last: a half-generated directory has no marker and is regenerated
+        with open(marker, "w") as f:
+            json.dump(counts, f)
+    with open(marker) as f:
+        return path, json.load(f)
+
+
+def _time(call, args_list):
+    """{cold_ms, median_ms, p95_ms, runs} of `call` over `args_list`, the first call counted as cold."""
+    timings = []
+    for args in args_list:
+        started = time.perf_counter()
+        call(*args)
+        timings.append(time.perf_counter() - started)
+    warm = timings[1:] or timings
+    return {
+        "cold_ms": _ms(timings[0]),
+        "median_ms": _ms(_percentile(warm, 0.5)),
+        "p95_ms": _ms(_percentile(warm, 0.95)),
+        "runs": len(timings),
+    }
+
+
+def run_one(scale, repeats=REPEATS):
+    """Time every operation against the data in the working directory; runs in a child process."""
+    # Imported here so GLUTENY_STORAGE from the parent is read by storage on import
+    import local_answers
+    import meal_utilis
+    import user_deletion
+    import utils
+
+    users, days = SCALES[scale]
+    rng = random.Random(SEED)
+    names = synth_data.user_names(users)
+    sample = [(rng.choice(names),) for _ in range(repeats + 1)]
+    day = (synth_data.START_DATE + timedelta(days=rng.randrange(days))).isoformat()
+
+    results = {
+        "get_memory_context": _time(utils.get_memory_context, sample),
+        "get_meal_by_date": _time(utils.get_meal_by_date, [(user, day) for user, in sample]),
+        # How the chat answers "what did I eat on <date>"
+        "local_answer": _time(local_answers.answer, [(user, f"what did I eat on {day}") for user, in sample]),
+        "get_meal_symptom_insight": _time(utils.get_meal_symptom_insight, sample),
+        "log_meal": _time(meal_utilis.log_meal, [(user, "2 rotis, dal, salad", "Lunch") for user, in sample]),
+    }
+
+    deleted = rng.sample(names, min(DELETIONS, users))
+    deletions, compactions = [], []
+    for user in deleted:
+        started = time.perf_counter()
+        user_deletion.delete_user(user)
+        deletions.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        user_deletion.schedule_compaction().result()
+        compactions.append(time.perf_counter() - started)
+    for op, timings in (("delete_user", deletions), ("compact", compactions)):
+        results[op] = {
+            "cold_ms": _ms(timings[0]),
+            "median_ms": _ms(_percentile(timings, 0.5)),
+            "p95_ms": _ms(_percentile(timings, 0.95)),
+            "runs": len(timings),
+        }
+    return results
+
+
+def run_pair(scale, backend, repeats=REPEATS):
+    """Results of one scale and backend, measured in a fresh process on a copy of the data."""
+    source, counts = data_dir(scale)
+    with tempfile.TemporaryDirectory(prefix=f"gluteny-bench-{scale}-{backend}-") as work:
+        target = os.path.join(work, "data")
+        shutil.copytree(source, target)
+        env = dict(os.environ, GLUTENY_STORAGE=backend)
+        env.pop("GLUTENY_DB", None)
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "one", scale, "--repeats", str(repeats)],
+            cwd=target, env=env, capture_output=True, text=True,
+        )
+    if result.returncode != 0:
+        raise RuntimeError(f"{scale}/{backend} failed:\n{result.stderr.strip()}")
+    return {
+        "scale": scale, "backend": backend,
+        "meal_rows": counts["meal_rows"], "symptom_rows": counts["symptom_rows"], "reports": counts["reports"],
+        "operations": json.loads(result.stdout.splitlines()[-1]),
+    }
+
+
+def environment():
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": SEED,
+    }
+
+
+def print_table(runs):
+    print(f"{'scale':<6} {'backend':<12} {'operation':<26} {'cold ms':>10} {'median ms':>10} {'p95 ms':>10}")
+    for run in runs:
+        for op, timing in run["operations"].items():
+            print(f"{run['scale']:<6} {run['backend']:<12} {op:<26} "
+                  f"{timing['cold_ms']:>10.1f} {timing['median_ms']:>10.1f} {timing['p95_ms']:>10.1f}")
+
+
+def run(scales, backends, repeats=REPEATS, output=RESULTS_FILE):
+    runs = []
+    for scale in scales:
+        for backend in backends:
+            print(f"Running {scale} on {backend}...", file=sys.stderr)
+            runs.append(run_pair(scale, backend, repeats))
+    results = {"environment": environment(), "repeats": repeats, "runs": runs}
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print_table(runs)
+    print(f"\nWrote {output}", file=sys.stderr)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Gluteny's data paths on synthetic data.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the suite and write the results")
+    run_parser.add_argument("--scales", default=",".join(SCALES), help="comma-separated, from " + ", ".join(SCALES))
+    run_parser.add_argument("--backends", default=",".join(BACKENDS), help="comma-separated, from " + ", ".join(BACKENDS))
+    run_parser.add_argument("--repeats", type=int, default=REPEATS)
+    run_parser.add_argument("--output", default=RESULTS_FILE)
+    # Used by run: one scale against the data in the working directory, results as JSON on stdout
+    one_parser = commands.add_parser("one")
+    one_parser.add_argument("scale", choices=list(SCALES))
+    one_parser.add_argument("--repeats", type=int, default=REPEATS)
+    args = parser.parse_args()
+
+    if args.command == "one":
+        print(json.dumps(run_one(args.scale, args.repeats)))
+    else:
+        scales, backends = args.scales.split(","), args.backends.split(",")
+        unknown = [name for name in scales if name not in SCALES] + [name for name in backends if name not in BACKENDS]
+        if unknown:
+            sys.exit(f"Unknown scale or backend: {', '.join(unknown)}")
+        run(scales, backends, args.repeats, args.output)
@@ -0,0 +1,77 @@
+# chat_render.py
+import html
+from functools import lru_cache
+
+import streamlit as st
+
+# Messages shown at first; "Show earlier messages" reveals this many more each time
+CHAT_WINDOW = 40
+
+CHAT_CSS = """
+<style>
+.st-key-chat_transcript {
+    padding: 1rem;
+    background-color: rgba(28, 28, 28, 0.95);
+    border-radius: 1rem;
+    border: 1px solid rgba(255, 255, 255, 0.1);
+    box-shadow: 0 0 12px rgba(0,255,100,0.1);
+    backdrop-filter: blur(4px);
+    margin-bottom: 1rem;
+}
+.user-msg {
+    background-color: rgba(60,60,60,0.8);
+    padding: 1rem;
+    border-radius: 1rem;
+    margin-bottom: 1rem;
+    max-width: 80%;
+    margin-left: auto;
+    text-align: right;
+    color: #ffffff !important;
+    font-size: 1rem;
+}
+.bot-msg {
+    background-color: rgba(46,204,113,0.3);
+    padding: 1rem;
+    border-radius: 1rem;
+    margin-bottom: 1rem;
+    max-width: 80%;
+    margin-right: auto;
+    text-align: left;
+    color: #ffffff !important;
+    font-size: 1rem;
+}
+</style>
+"""
+
+
+@lru_cache(maxsize=4096)
+def message_html(speaker, msg):
+    """HTML for one chat message; each message is escaped once and then reused."""
+    css_class = "user-msg" if speaker == "You" else "bot-msg"
+    # Kept on one line so Markdown never re-parses the escaped text
+    body = html.escape(msg).replace("\n", "<br>")
+    return f'<div class="{css_class}"><strong>{html.escape(speaker)}:</strong><br>{body}</div>'
+
+
+def _show_earlier(user, shown):
+    st.session_state.chat_window[user] = shown + CHAT_WINDOW
+
+
+@st.fragment
+def render_transcript(user, history):
+    """Show the latest CHAT_WINDOW messages of `history`, one element per message.
+
+    Older messages stay out of the page until asked for, so a rerun costs
+    the same however long the conversation gets. Paging only reruns this
+    fragment, not the whole app.
+    """
+    st.markdown(CHAT_CSS, unsafe_allow_html=True)
+    windows = st.session_state.setdefault("chat_window", {})
+    shown = windows.get(user, CHAT_WINDOW)
+    hidden = max(0, len(history) - shown)
+
+    with st.container(height=400, key="chat_transcript"):
+        if hidden:
+            st.button(f"Show earlier messages ({hidden} more)", key="chat_show_earlier", on_click=_show_earlier, args=(user, shown))
+        for speaker, msg in history[-shown:]:
+            st.markdown(message_html(speaker, msg), unsafe_allow_html=True)
@@ -1,20 +1,12 @@
 import streamlit as st
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
 from datetime import datetime, date
-import pandas as pd
-import pandas.errors
-import json
+from llm_client import complete
+from storage import append_meal, load_user_profiles, meal_log, save_user_profile
+from user_deletion import delete_user
+from insight_store import record_row
+from nutrient_db import calculate_nutritional_score
+from report_index import report_context
 
-# Load API key
-load_dotenv()
-api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key)
-
-USER_FILE = "user_profiles.json"
-MEAL_LOG_FILE = "meal_log.csv"
-REPORT_FILE = "report_memory.txt"
 
 # --- Define base context ---
 def get_base_context(user_name):
@@ -166,35 +158,17 @@ def apply_upload_style():
 
 
 # --- Helper: Load meals + reports for memory ---
-def get_memory_context(user):
+def get_memory_context(user, query=None):
     memory = ""
-    if os.path.exists(MEAL_LOG_FILE):
-        try:
-            df = pd.read_csv(MEAL_LOG_FILE)
-            user_logs = df[df["name"] == user].tail(5)
-            if not user_logs.empty:
-                memory += f"Recent meals for {user}:\n"
-                for _, row in user_logs.iterrows():
-                    memory += f"- {row['meal_type']}: {row['meal']} on {row['timestamp']}\n"
-        except pd.errors.EmptyDataError:
-            memory += "\n(Meal log exists but is empty)\n"
-    if os.path.exists(REPORT_FILE):
-        with open(REPORT_FILE, "r") as f:
-            lines = f.readlines()[-10:]
-            memory += "\nReport Summary (latest 10 lines):\n" + "".join(lines)
+    user_logs = meal_log().recent(user, 5)
+    if not user_logs.empty:
+        memory += f"Recent meals for {user}:\n"
+        for row in user_logs.itertuples(index=False):
+            memory += f"- {row.meal_type}: {row.meal} on {row.timestamp}\n"
+    memory += report_context(user, query=query)
     return memory
 
 # --- Session State Initialization ---
-def load_user_profiles():
-    if os.path.exists(USER_FILE):
-        with open(USER_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_user_profiles():
-    with open(USER_FILE, "w") as f:
-        json.dump(st.session_state.user_profiles, f)
-
 if "users" not in st.session_state:
     st.session_state.user_profiles = load_user_profiles()
     st.session_state.users = list(st.session_state.user_profiles.keys())
@@ -250,7 +224,7 @@ with st.expander("➕➖ Manage Users"):
                 profile_text = f"{new_context}\nHeight: {height_cm} cm\nWeight: {weight_kg} kg\nBMI: {bmi}\nAge: {age} years\nGender: {gender}"
                 st.session_state.users.append(new_user)
                 st.session_state.user_profiles[new_user] = profile_text
-                save_user_profiles()
+                save_user_profile(new_user, profile_text)
                 st.rerun()
 
     with col2:
@@ -260,11 +234,8 @@ with st.expander("➕➖ Manage Users"):
                 st.session_state.users.remove(user_to_delete)
                 st.session_state.chat_history.pop(user_to_delete, None)
                 st.session_state.user_profiles.pop(user_to_delete, None)
-                save_user_profiles()
-                if os.path.exists(MEAL_LOG_FILE):
-                    df = pd.read_csv(MEAL_LOG_FILE)
-                    df = df[df["name"] != user_to_delete]
-                    df.to_csv(MEAL_LOG_FILE, index=False)
+                st.session_state.get("conversation_memory", {}).pop(user_to_delete, None)
+                delete_user(user_to_delete)
                 st.rerun()
 
 # --- Chat Assistant ---
@@ -276,18 +247,13 @@ if current_user:
     if user_input:
         try:
             user_context = get_base_context(current_user)
-            memory_context = get_memory_context(current_user)
+            memory_context = get_memory_context(current_user, query=user_input)
             full_context = f"You are a friendly nutritionist.\nUser info:\n{user_context}\n\nMemory:\n{memory_context}"
 
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": full_context},
-                    {"role": "user", "content": user_input},
-                ]
-            )
-
-            answer = response.choices[0].message.content.strip()
+            answer = complete([
+                {"role": "system", "content": full_context},
+                {"role": "user", "content": user_input},
+            ])
             st.session_state.chat_history[current_user].append(("You", user_input))
             st.session_state.chat_history[current_user].append(("Coach", answer))
 
@@ -301,13 +267,6 @@ if current_user:
 st.markdown("---")
 st.subheader("🍽️ Log a Meal")
 
-def calculate_nutritional_score(meal):
-    calories = 200
-    protein = 15
-    fat = 10
-    carbs = 30
-    return 100 - abs(50 - protein) - abs(50 - carbs) - abs(50 - fat)
-
 if current_user:
     with st.form("meal_form", clear_on_submit=True):
         meal_text = st.text_input("What did you eat?", placeholder="e.g. 2 rotis, paneer, salad")
@@ -323,15 +282,13 @@ if current_user:
                 "meal_type": meal_type
             }
 
-            df = pd.DataFrame([log_entry])
-            if os.path.exists(MEAL_LOG_FILE):
-                df.to_csv(MEAL_LOG_FILE, mode='a', header=False, index=False)
-            else:
-                df.to_csv(MEAL_LOG_FILE, mode='w', header=True, index=False)
+            append_meal(log_entry)
+            record_row(log_entry)
 
-            score = calculate_nutritional_score(meal_text)
+            score = calculate_nutritional_score(meal_text, log_entry["ingredients"])
             st.success(f"{meal_type} logged for {current_user} ✅")
-            st.write(f"Nutritional Quality Score for this meal: {score}")
+            if score is not None:
+                st.write(f"Nutritional Quality Score for this meal: {score}")
             st.rerun()
 else:
     st.error("Please select a user first to log a meal.")
@@ -340,16 +297,8 @@ else:
 if current_user:
     st.subheader(f"📋 Today's Meals for {current_user}")
 
-    if os.path.exists(MEAL_LOG_FILE):
-        try:
-            all_logs = pd.read_csv(MEAL_LOG_FILE)
-            if "date" in all_logs.columns:
-                today_logs = all_logs[(all_logs["date"] == str(date.today())) & (all_logs["name"] == current_user)]
-                if not today_logs.empty:
-                    st.dataframe(today_logs[["timestamp", "meal_type", "meal"]].sort_values("timestamp"))
-                else:
-                    st.info(f"No meals logged for {current_user} today yet.")
-        except pd.errors.EmptyDataError:
-            st.info("Meal log is empty.")
+    today_logs = meal_log().on_date(current_user, str(date.today()))
+    if not today_logs.empty:
+        st.dataframe(today_logs[["timestamp", "meal_type", "meal"]].sort_values("timestamp"))
     else:
-        st.info("Meal log not found.")
+        st.info(f"No meals logged for {current_user} today yet.")
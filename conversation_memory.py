@@ -0,0 +1,91 @@
+# conversation_memory.py
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_client import complete
+from prompt_budget import truncate
+
+KEEP_TURNS = int(os.getenv("GLUTENY_MEMORY_TURNS", 3))
+SUMMARY_TOKENS = int(os.getenv("GLUTENY_SUMMARY_TOKENS", 200))
+MESSAGE_TOKENS = 400
+
+ROLES = {"You": "user", "Coach": "assistant"}
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and Gluteny, their nutrition coach.
+Update the summary with the new exchanges below. Keep facts the coach will need later: foods, symptoms,
+goals, advice already given and open questions. Write at most {words} words, in plain sentences.
+
+Current summary:
+{summary}
+
+New exchanges:
+{exchanges}"""
+
+# One background worker is plenty: summaries are small and only refreshed every few turns
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gluteny-summary")
+
+
+def _format(entries):
+    return "\n".join(f"{speaker}: {msg}" for speaker, msg in entries)
+
+
+def summarize(summary, entries):
+    """Fold `entries` into `summary`, falling back to a trimmed transcript if the LLM call fails."""
+    prompt = SUMMARY_PROMPT.format(words=SUMMARY_TOKENS * 3 // 4, summary=summary or "(none yet)", exchanges=_format(entries))
+    try:
+        updated = complete([{"role": "user", "content": prompt}])
+    except Exception:
+        updated = "\n".join(filter(None, [summary, _format(entries)]))
+    return truncate(updated, SUMMARY_TOKENS, keep="tail")
+
+
+class ConversationMemory:
+    """Last KEEP_TURNS exchanges verbatim plus a rolling summary of everything older.
+
+    Older turns are summarized on a background thread; until a refresh
+    finishes, the previous summary is used, so a request never waits for it.
+    """
+
+    def __init__(self, keep_turns=KEEP_TURNS):
+        self.keep_entries = keep_turns * 2
+        self.summary = ""
+        self.summarized = 0  # history entries [0, summarized) are folded into the summary
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def _collect(self):
+        with self._lock:
+            if self._pending is not None and self._pending.done():
+                try:
+                    summary, upto = self._pending.result()
+                    if upto > self.summarized:
+                        self.summary, self.summarized = summary, upto
+                except Exception:
+                    pass
+                self._pending = None
+
+    def _refresh(self, history):
+        """Start folding turns that dropped out of the verbatim window into the summary."""
+        upto = len(history) - self.keep_entries
+        with self._lock:
+            if upto <= self.summarized or self._pending is not None:
+                return
+            entries = list(history[self.summarized:upto])
+            summary = self.summary
+            self._pending = _executor.submit(lambda: (summarize(summary, entries), upto))
+
+    def messages(self, history):
+        """Chat messages carrying the conversation so far (not including the new question)."""
+        if len(history) < self.summarized:
+            # The history was cleared or replaced; start over
+            self.summary, self.summarized, self._pending = "", 0, None
+        self._collect()
+        self._refresh(history)
+
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"})
+        for speaker, msg in history[-self.keep_entries:] if self.keep_entries else []:
+            messages.append({"role": ROLES.get(speaker, "user"), "content": truncate(msg, MESSAGE_TOKENS)})
+        return messages
@@ -0,0 +1,103 @@
+# dev_openai_stub.py
+"""Minimal OpenAI-compatible chat completions server for local testing.
+
+Replies with a canned coach answer that quotes the user's question, one word
+per streamed chunk, without any network access or API key.
+
+    python dev_openai_stub.py --port 8765 --delay 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=test streamlit run nutrition_assistant.py
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DELAY = 0.05
+ERROR_RATE = 0.0
+
+
+def _reply_text(messages):
+    question = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    return f"(stub coach) You asked: {question} Try adding more vegetables and keep logging your meals."
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if random.random() < ERROR_RATE:
+            # Exercise the client's retry path with the errors OpenAI actually returns
+            status = random.choice([429, 500, 503])
+            data = json.dumps({"error": {"message": "stub failure", "type": "server_error", "code": status}}).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        model = body.get("model", "stub")
+        text = _reply_text(body.get("messages", []))
+        created = int(time.time())
+
+        if not body.get("stream"):
+            payload = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(text.split()), "total_tokens": len(text.split())},
+            }
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            delta = {"content": word + (" " if i < len(words) - 1 else "")}
+            if i == 0:
+                delta["role"] = "assistant"
+            self._event({"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+            time.sleep(DELAY)
+        self._event({"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _event(self, payload):
+        self.wfile.write(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    global DELAY, ERROR_RATE
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=DELAY, help="seconds between streamed words")
+    parser.add_argument("--error-rate", type=float, default=ERROR_RATE, help="fraction of requests answered with 429/5xx")
+    args = parser.parse_args()
+    DELAY = args.delay
+    ERROR_RATE = args.error_rate
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"Stub OpenAI server on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 const { app, BrowserWindow } = require("electron");
 const path = require("path");
 const { spawn } = require("child_process");
+const http = require("http");
+
+const HEALTH_URL = "http://localhost:8501/_stcore/health";
 
 let mainWindow;
 let streamlitProcess;
@@ -25,6 +28,27 @@ function createWindow() {
   });
 }
 
+// Poll Streamlit's health check and open the window as soon as it answers
+function waitForStreamlit(onReady, attempts = 150) {
+  const retry = () => {
+    if (attempts > 1) {
+      setTimeout(() => waitForStreamlit(onReady, attempts - 1), 200);
+    } else {
+      console.error("Streamlit did not become ready on port 8501");
+    }
+  };
+  http
+    .get(HEALTH_URL, (res) => {
+      res.resume();
+      if (res.statusCode === 200) {
+        onReady();
+      } else {
+        retry();
+      }
+    })
+    .on("error", retry);
+}
+
 app.on("ready", () => {
   // Launch Streamlit
   streamlitProcess = spawn("streamlit", ["run", "Nutrition_Assistant.py"], {
@@ -33,18 +57,14 @@ app.on("ready", () => {
   });
 
   streamlitProcess.stdout.on("data", (data) => {
-    const msg = data.toString();
-    console.log("Streamlit:", msg);
-
-    if (msg.includes("Running on")) {
-      // Open the window after the Streamlit server is ready
-      createWindow();
-    }
+    console.log("Streamlit:", data.toString());
   });
 
   streamlitProcess.stderr.on("data", (data) => {
     console.error("Streamlit Error:", data.toString());
   });
+
+  waitForStreamlit(createWindow);
 });
 
 app.on("window-all-closed", function () {
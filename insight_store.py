@@ -0,0 +1,211 @@
+# insight_store.py
+"""Running meal-symptom co-occurrence counters, one JSON file per user.
+
+The counters match symptom_insights.correlate() in same-date mode: a meal
+counts towards a symptom when that symptom was logged on the meal's date.
+They are updated as rows are logged, so the prompt insight is a lookup
+instead of a scan of the whole history; a user without counters gets them
+built from the log on first read.
+
+The counters file, read on every chat message, holds only the counts. The
+meals and symptoms of recent days, needed to pair a symptom with the meals
+logged earlier that day, live in a second file that only writes read, and
+only the last KEEP_DAYS days are kept. A row dated before them (the log
+form allows back-dating) rebuilds the user's counters from the log.
+
+Usage:
+    python insight_store.py rebuild [user ...]
+"""
+import os
+import sys
+from datetime import date, timedelta
+from urllib.parse import quote
+
+from storage import meal_log, symptom_log
+from meal_parser import PARSER_VERSION
+from meal_store import atomic_write_json, file_version, load_cached, locked, read_json
+from symptom_insights import ingredients_of, symptoms_of
+from tracing import traced
+
+INSIGHT_DIR = "insight_aggregates"
+# Days of meals and symptoms kept for pairing rows logged later with the same date
+KEEP_DAYS = int(os.getenv("GLUTENY_INSIGHT_DAYS", 30))
+
+# counters path -> ((mtime_ns, size), state)
+_cache = {}
+
+
+def _path(user):
+    return os.path.join(INSIGHT_DIR, quote(user, safe="") + ".json")
+
+
+def _days_path(user):
+    return os.path.join(INSIGHT_DIR, quote(user, safe="") + ".days.json")
+
+
+def _empty_state():
+    return {"parser": PARSER_VERSION, "meals": 0, "ingredients": {}, "symptoms": {}, "pairs": {}}
+
+
+def _empty_days():
+    # `since`: the first date whose meals and symptoms are all in `days` ("" = every date)
+    return {"since": "", "days": {}}
+
+
+def _read_state(path):
+    state = read_json(path)
+    if state.get("parser") != PARSER_VERSION or "days" in state:
+        # Counted under older ingredient names, or written before the days moved out; rebuilt
+        return None
+    return state
+
+
+def _load(user):
+    try:
+        return load_cached(_path(user), _cache, _read_state)
+    except FileNotFoundError:
+        return None
+
+
+def _load_days(user):
+    try:
+        return read_json(_days_path(user))
+    except FileNotFoundError:
+        return None
+
+
+def _trim(days):
+    """Keep the last KEEP_DAYS days before the newest one."""
+    if not days["days"]:
+        return
+    since = (date.fromisoformat(max(days["days"])) - timedelta(days=KEEP_DAYS)).isoformat()
+    old = [day for day in days["days"] if day < since]
+    if old:
+        for day in old:
+            del days["days"][day]
+        days["since"] = since
+
+
+def _save(user, state, days):
+    os.makedirs(INSIGHT_DIR, exist_ok=True)
+    _trim(days)
+    atomic_write_json(_days_path(user), days)
+    path = _path(user)
+    atomic_write_json(path, state)
+    # The next insight_text reads the state just written instead of parsing the file again
+    _cache[path] = (file_version(path), state)
+
+
+def _bump(counter, key, amount=1):
+    counter[key] = counter.get(key, 0) + amount
+
+
+def _add(state, days, date, ingredients, symptoms):
+    """Fold one logged event (a meal, symptoms, or both) into `state` and `days`."""
+    day = days["days"].setdefault(date, {"symptoms": [], "meals": []})
+    seen = set(day["symptoms"])
+    new_symptoms = set(symptoms) - seen
+
+    # Meals already logged that day now count towards the new symptoms too
+    for meal in day["meals"]:
+        for symptom in new_symptoms:
+            _bump(state["symptoms"], symptom)
+            pairs = state["pairs"].setdefault(symptom, {})
+            for ingredient in meal:
+                _bump(pairs, ingredient)
+
+    day_symptoms = seen | new_symptoms
+    if ingredients:
+        state["meals"] += 1
+        for ingredient in ingredients:
+            _bump(state["ingredients"], ingredient)
+        for symptom in day_symptoms:
+            _bump(state["symptoms"], symptom)
+            pairs = state["pairs"].setdefault(symptom, {})
+            for ingredient in ingredients:
+                _bump(pairs, ingredient)
+        day["meals"].append(list(ingredients))
+    day["symptoms"] = sorted(day_symptoms)
+
+
+def rebuild_user(user):
+    """Recompute `user`'s counters from the meal and symptom logs."""
+    state, days = _empty_state(), _empty_days()
+    for row in meal_log().for_user(user).itertuples(index=False):
+        _add(state, days, row.date, ingredients_of(row.meal, row.ingredients), symptoms_of(row.symptoms))
+    for row in symptom_log().for_user(user).itertuples(index=False):
+        _add(state, days, row.date, [], symptoms_of(row.symptoms))
+    _save(user, state, days)
+    return state
+
+
+def rebuild(users=None):
+    if users is None:
+        users = sorted(set(meal_log().users()) | set(symptom_log().users()))
+    for user in users:
+        rebuild_user(user)
+    return users
+
+
+def record_row(entry):
+    """Update counters for a row just appended to the meal log."""
+    user = entry["name"]
+    os.makedirs(INSIGHT_DIR, exist_ok=True)
+    with locked(_path(user)):
+        state = _load(user)
+        days = _load_days(user) if state is not None else None
+        if state is None or days is None or entry["date"] < days["since"]:
+            # No counters yet, or the row is dated before the days kept: build them from the
+            # log, which already holds this row
+            rebuild_user(user)
+            return
+        _add(state, days, entry["date"], ingredients_of(entry.get("meal", ""), entry.get("ingredients", "")), symptoms_of(entry.get("symptoms", "")))
+        _save(user, state, days)
+
+
+def forget_user(user):
+    """Drop `user`'s counters; they are rebuilt from the log if the name logs again."""
+    os.makedirs(INSIGHT_DIR, exist_ok=True)
+    with locked(_path(user)):
+        for path in (_path(user), _days_path(user)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        _cache.pop(_path(user), None)
+
+
+@traced("insights.stored")
+def insight_text(user, top_n=2):
+    """Prompt insight from the stored counters, built from the log if the user has none yet."""
+    state = _load(user)
+    if state is None:
+        os.makedirs(INSIGHT_DIR, exist_ok=True)
+        with locked(_path(user)):
+            # Another session may have built them while this one waited
+            state = _load(user) or rebuild_user(user)
+
+    n_meals = state["meals"]
+    insight = ""
+    for symptom, with_symptom in sorted(state["symptoms"].items(), key=lambda item: (-item[1], item[0])):
+        pairs = state["pairs"].get(symptom, {})
+
+        def rank(item):
+            ingredient, count = item
+            lift = count * n_meals / (state["ingredients"].get(ingredient, 1) * with_symptom)
+            return (-count, -lift, ingredient)
+
+        top = sorted(pairs.items(), key=rank)[:top_n]
+        insight += f"🔁 **{symptom}** has occurred after meals like:\n"
+        for ingredient, count in top:
+            insight += f"• {ingredient} ({count} times)\n"
+        insight += "\n"
+    return insight.strip()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print(__doc__)
+        sys.exit(1)
+    rebuilt = rebuild(sys.argv[2:] or None)
+    print(f"Rebuilt insight counters for {len(rebuilt)} user(s).")
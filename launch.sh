@@ -19,8 +19,13 @@ fi
 echo "Starting Streamlit on port $PORT..."
 streamlit run Nutrition_Assistant.py --server.port=$PORT > streamlit.log 2>&1 &
 
-# Wait for Streamlit to start
-sleep 3
+# Wait until Streamlit answers its health check (at most 30 seconds)
+for _ in $(seq 1 150); do
+  if curl -sf "http://localhost:$PORT/_stcore/health" > /dev/null; then
+    break
+  fi
+  sleep 0.2
+done
 
 # Open in browser
 open http://localhost:$PORT
@@ -0,0 +1,132 @@
+# llm_client.py
+import os
+import random
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from tracing import span
+
+# openai is imported on first use: it is the slowest import of the app and the first page never needs it
+load_dotenv()
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+CONNECT_TIMEOUT = float(os.getenv("GLUTENY_LLM_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.getenv("GLUTENY_LLM_READ_TIMEOUT", 60))
+MAX_RETRIES = int(os.getenv("GLUTENY_LLM_MAX_RETRIES", 3))
+MAX_IN_FLIGHT = int(os.getenv("GLUTENY_LLM_MAX_IN_FLIGHT", 4))
+# How long a request may wait for a free slot before giving up
+QUEUE_TIMEOUT = float(os.getenv("GLUTENY_LLM_QUEUE_TIMEOUT", 30))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+
+_client = None
+_client_lock = threading.Lock()
+_in_flight = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+
+
+class CoachBusyError(RuntimeError):
+    """Raised when every completion slot stayed busy for QUEUE_TIMEOUT seconds."""
+
+
+def get_client():
+    """Process-wide OpenAI client; its HTTP connection pool is shared by every session.
+
+    OPENAI_BASE_URL points it at a local stand-in server. Retries are done
+    here rather than by the SDK so they can be jittered and counted against
+    the in-flight limit.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import openai
+
+                _client = openai.OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    base_url=os.getenv("OPENAI_BASE_URL") or None,
+                    timeout=openai.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                    max_retries=0,
+                )
+    return _client
+
+
+def _retryable(error):
+    import openai
+
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError)):
+        return True  # APITimeoutError is a subclass of APIConnectionError
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _backoff(attempt, error):
+    retry_after = None
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            retry_after = float(response.headers.get("retry-after", ""))
+        except ValueError:
+            pass
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_CAP)
+    # Full jitter: spread retries from many sessions instead of synchronising them
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def _create(**kwargs):
+    import openai
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            with span("openai.chat.completions.create", model=kwargs.get("model"),
+                      stream=bool(kwargs.get("stream")), attempt=attempt) as s:
+                response = get_client().chat.completions.create(**kwargs)
+                # Streams carry no usage; stream_completion counts their chunks instead
+                usage = getattr(response, "usage", None)
+                if usage is not None:
+                    s.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+            return response
+        except openai.APIError as e:
+            if attempt == MAX_RETRIES or not _retryable(e):
+                raise
+            time.sleep(_backoff(attempt, e))
+
+
+def _acquire_slot():
+    if not _in_flight.acquire(timeout=QUEUE_TIMEOUT):
+        raise CoachBusyError("The coach is busy with other conversations, please try again in a moment.")
+
+
+def complete(messages, model=DEFAULT_MODEL):
+    _acquire_slot()
+    try:
+        response = _create(model=model, messages=messages)
+    finally:
+        _in_flight.release()
+    return response.choices[0].message.content.strip()
+
+
+def stream_completion(messages, model=DEFAULT_MODEL):
+    """Yield pieces of the reply as the server sends them.
+
+    Failures before the stream opens are retried; the slot is held until the
+    stream is fully read.
+    """
+    _acquire_slot()
+    try:
+        stream = _create(model=model, messages=messages, stream=True)
+        try:
+            with span("openai.stream", model=model) as s:
+                chunks = 0
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        chunks += 1
+                        yield chunk.choices[0].delta.content
+                # About one token per content chunk
+                s.set(completion_chunks=chunks)
+        finally:
+            stream.close()
+    finally:
+        _in_flight.release()
@@ -0,0 +1,171 @@
+# llm_worker.py
+"""Coach requests run off the Streamlit script thread.
+
+The page submits a chat job and carries on rendering. An asyncio loop on one
+background thread runs the jobs concurrently (each blocking OpenAI call in
+the loop's thread pool, still bounded by llm_client's in-flight limit) and
+files every job in the inbox of each session that asked for it. The page
+polls its inbox from a fragment, or picks the result up on its next rerun.
+
+Jobs are keyed like the reply cache, on (model, context, question):
+submitting a key that is already queued or running joins that job instead
+of paying for the request again, so a rerun, a second tab or a double click
+never sends it twice. cancel() withdraws one session; once no session wants
+a job it is cancelled, and a streamed reply stops at the next chunk.
+"""
+import asyncio
+import os
+import threading
+import time
+
+from llm_client import DEFAULT_MODEL, complete, stream_completion
+from tracing import span
+
+# Finished jobs nobody collected (e.g. the tab was closed) are dropped after this many seconds
+INBOX_TTL = float(os.getenv("GLUTENY_INBOX_TTL", 600))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+_loop = None
+_loop_lock = threading.Lock()
+# key -> Job, while queued or running
+_jobs = {}
+# session id -> {key: Job}
+_inboxes = {}
+_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """One chat completion and who is waiting for it."""
+
+    def __init__(self, key, messages, stream, model):
+        self.key = key
+        self.messages = messages
+        self.stream = stream
+        self.model = model
+        self.status = QUEUED
+        self.partial = ""  # the streamed reply so far
+        self.answer = None
+        self.error = None
+        self.finished_at = None
+        self.sessions = set()
+        self._cancel = threading.Event()
+        self._future = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def _finish(self, status):
+        self.status = status
+        self.finished_at = time.time()
+
+
+def get_loop():
+    """The worker's event loop, started on first use."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="gluteny-llm-worker", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def _call(job, on_done):
+    with span("coach.job", stream=job.stream, model=job.model) as s:
+        if job.stream:
+            for piece in stream_completion(job.messages, job.model):
+                if job._cancel.is_set():
+                    # Leaving the loop closes the stream, so the rest of the reply is never generated
+                    raise JobCancelled()
+                job.partial += piece
+            answer = job.partial.strip()
+        else:
+            answer = complete(job.messages, job.model)
+        s.set(answer_chars=len(answer))
+    if answer and on_done is not None:
+        on_done(answer)
+    return answer
+
+
+async def _run(job, on_done):
+    if job._cancel.is_set():
+        return  # cancelled while queued
+    job.status = RUNNING
+    try:
+        job.answer = await asyncio.to_thread(_call, job, on_done)
+        job._finish(DONE)
+    except (asyncio.CancelledError, JobCancelled):
+        job._finish(CANCELLED)
+    except Exception as e:
+        job.error = e
+        job._finish(FAILED)
+    finally:
+        with _lock:
+            if _jobs.get(job.key) is job:
+                del _jobs[job.key]
+
+
+def _prune(now):
+    for session, inbox in list(_inboxes.items()):
+        for key, job in list(inbox.items()):
+            if job.finished and now - job.finished_at > INBOX_TTL:
+                del inbox[key]
+        if not inbox:
+            del _inboxes[session]
+
+
+def submit(session, key, messages, stream=True, model=DEFAULT_MODEL, on_done=None):
+    """Queue a chat job for `session`, or join the one already running for `key`; returns the Job.
+
+    on_done(answer) runs on the worker once a non-empty answer is complete, e.g. to cache it.
+    """
+    with _lock:
+        _prune(time.time())
+        job = _jobs.get(key)
+        # A cancelled job may still be winding down; it is not joined
+        if job is None or job._cancel.is_set():
+            job = _jobs[key] = Job(key, messages, stream, model)
+            job._future = asyncio.run_coroutine_threadsafe(_run(job, on_done), get_loop())
+        job.sessions.add(session)
+        _inboxes.setdefault(session, {})[key] = job
+    return job
+
+
+def inbox(session):
+    """{key: Job} submitted by `session` and not collected yet, finished or not."""
+    with _lock:
+        return dict(_inboxes.get(session, {}))
+
+
+def collect(session, key):
+    """The finished Job for `key`, removed from `session`'s inbox; None while it is still running."""
+    with _lock:
+        job = _inboxes.get(session, {}).get(key)
+        if job is None or not job.finished:
+            return None
+        del _inboxes[session][key]
+        return job
+
+
+def cancel(session, key):
+    """Withdraw `session` from the job for `key`; the job itself stops once no session is waiting for it."""
+    with _lock:
+        job = _inboxes.get(session, {}).pop(key, None)
+        if job is None:
+            return
+        job.sessions.discard(session)
+        if not job.sessions and not job.finished:
+            job._cancel.set()
+            job._future.cancel()
+            if job.status == QUEUED:
+                # A task cancelled before it starts never runs _run's cleanup
+                job._finish(CANCELLED)
+                if _jobs.get(key) is job:
+                    del _jobs[key]
@@ -0,0 +1,337 @@
+# local_answers.py
+"""Answers to questions about a user's own log, without asking the coach.
+
+    "what did I eat this week"                  ->  the meals logged since Monday
+    "what did I have for dinner yesterday"      ->  yesterday's dinner
+    "how often did I get bloating last month"   ->  how many times, on how many days
+    "when did I last have paneer"               ->  the latest meal with paneer in it
+
+answer() tries each intent's pattern in turn and answers the first that
+matches from meal_log() and symptom_log(), using their per-user indexes, so
+a reply takes milliseconds. A question only counts as matched when all of
+it is understood: "what did I eat that gave me gas" is left to the coach,
+and so are symptoms the user never logged and foods the meal parser does
+not know ("when did I last eat too much sugar").
+Unmatched questions return None and go to the LLM as before.
+
+Ranges understood: today, yesterday, this/last week, this/last month,
+"the last 10 days" (or weeks, months), a month name, "on 31 March", "on the
+3rd" (this month's, or last month's if it has not come yet) and
+"since 2025-03-01".
+
+Hits and misses are counted per process; stats() gives the hit rate, which
+the chat sidebar shows next to the reply cache's.
+
+Usage:
+    python local_answers.py USER "how often did I get bloating last month"
+"""
+import calendar
+import re
+import sys
+import threading
+from datetime import date, datetime, timedelta
+
+import meal_parser
+from nutrient_db import get_table
+from storage import meal_log, symptom_log
+from symptom_insights import SYMPTOMS, symptoms_of
+from tracing import span
+
+# Longer lists are cut here, with a count of the rest
+MAX_LISTED = 30
+MEAL_TYPES = ["breakfast", "lunch", "dinner", "snack"]
+
+_NUMBERS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+            "eight": 8, "nine": 9, "ten": 10, "couple of": 2, "few": 3}
+_MONTHS = [name.lower() for name in calendar.month_name[1:]]
+
+_MEALS = re.compile(
+    r"\bwhat (?:did|have|do) i (?:eat|eaten|ate|have|had)\b"
+    r"(?: for (?P<meal_type>" + "|".join(MEAL_TYPES) + r")s?\b)?(?P<when>.*)$"
+)
+_SYMPTOM_COUNT = re.compile(
+    r"\bhow (?:often|many times) (?:did|have|do) i (?:get|got|gotten|have|had|feel|felt|experience|experienced"
+    r"|suffer from|suffered from) (?P<rest>.+)$"
+)
+_LAST_HAD = re.compile(
+    r"\bwhen (?:did i (?:last )?(?:eat|have|had)|was the last time i (?:ate|had|have had|have eaten)) "
+    r"(?P<food>.+?)(?: last)?$"
+)
+_TRAILING = re.compile(r"[\s?.!]+$")
+_PAST_N = re.compile(
+    r"^(?:in |over |during )?(?:the )?(?:last|past) (?:(?P<n>\d+|" + "|".join(map(re.escape, _NUMBERS)) + r") )?"
+    r"(?P<unit>day|week|month)s?$"
+)
+_MONTH = re.compile(r"^(?:in |during )?(?P<month>" + "|".join(_MONTHS) + r")(?: (?P<year>\d{4}))?$")
+_ON_DATE = re.compile(r"^(?P<word>on|since) (?P<date>.+)$")
+
+_hits = {}
+_misses = 0
+_stats_lock = threading.Lock()
+
+
+def _long_date(day):
+    return day.strftime("%B %d, %Y")
+
+
+def _months_before(day, months):
+    year, month = divmod(day.year * 12 + day.month - 1 - months, 12)
+    return date(year, month + 1, min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def _month_range(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _parse_date(text, today):
+    """A date typed by the user, e.g. '31 March' or '2025-03-31'; None if it is not one."""
+    from dateutil import parser
+
+    # Without a digit dateutil happily reads "fog" or "march" as today's date
+    if not re.search(r"\d", text):
+        return None
+    text = re.sub(r"^the ", "", text)
+    try:
+        # Parsed against two defaults that differ in every field, to tell which ones were typed
+        typed = parser.parse(text, default=datetime(2000, 1, 1))
+        other = parser.parse(text, default=datetime(2004, 3, 2))
+    except (ValueError, OverflowError):
+        return None
+    if typed.day != other.day:
+        return None
+    year = typed.year if typed.year == other.year else today.year
+    if typed.month != other.month:
+        # "the 3rd" is this month's, or last month's if it has not come yet
+        for back in range(3):
+            month = _months_before(date(year, today.month, 1), back)
+            if typed.day <= calendar.monthrange(month.year, month.month)[1]:
+                day = month.replace(day=typed.day)
+                if day <= today:
+                    return day
+        return None
+    try:
+        day = date(year, typed.month, typed.day)
+        if day > today and typed.year != other.year:
+            # "31 December" asked in January means last year's
+            day = day.replace(year=year - 1)
+    except ValueError:
+        return None
+    return day
+
+
+def parse_range(text, today=None):
+    """(first day, last day, label) for a range like "last month", or None if `text` is not one.
+
+    Empty text is all time: (None, today, "").
+    """
+    today = today or date.today()
+    text = text.strip()
+    if not text:
+        return None, today, ""
+    if text == "today":
+        return today, today, "today"
+    if text == "yesterday":
+        day = today - timedelta(days=1)
+        return day, day, "yesterday"
+    if text == "this week":
+        return today - timedelta(days=today.weekday()), today, "this week"
+    if text == "last week":
+        monday = today - timedelta(days=today.weekday() + 7)
+        return monday, monday + timedelta(days=6), "last week"
+    if text == "this month":
+        return today.replace(day=1), today, "this month"
+    if text == "last month":
+        previous = _months_before(today.replace(day=1), 1)
+        return (*_month_range(previous.year, previous.month), "last month")
+    match = _PAST_N.match(text)
+    if match:
+        n = match.group("n")
+        n = int(n) if n and n.isdigit() else _NUMBERS.get(n, 1)
+        unit = match.group("unit")
+        if unit == "month":
+            first = _months_before(today, n) + timedelta(days=1)
+        else:
+            first = today - timedelta(days=n * (7 if unit == "week" else 1) - 1)
+        label = f"in the last {n} {unit}s" if n != 1 else f"in the last {unit}"
+        return first, today, label
+    match = _MONTH.match(text)
+    if match:
+        month = _MONTHS.index(match.group("month")) + 1
+        year = int(match.group("year")) if match.group("year") else today.year - (month > today.month)
+        first, last = _month_range(year, month)
+        return first, min(last, today), f"in {first.strftime('%B %Y')}"
+    match = _ON_DATE.match(text)
+    if match:
+        day = _parse_date(match.group("date"), today)
+        if day is None:
+            return None
+        if match.group("word") == "since":
+            return day, today, f"since {_long_date(day)}"
+        return day, day, f"on {_long_date(day)}"
+    day = _parse_date(text, today)
+    if day is not None:
+        return day, day, f"on {_long_date(day)}"
+    return None
+
+
+def _rows(log, user, first, last):
+    frame = log.for_user(user, since=first.isoformat() if first else None)
+    if frame.empty:
+        return frame
+    return frame[frame["date"] <= last.isoformat()]
+
+
+def _meals(user, match, today):
+    when = parse_range(match.group("when"), today)
+    if when is None:
+        return None
+    first, last, label = when
+    if not label:
+        # "what did I eat" on its own asks about today
+        first, last, label = today, today, "today"
+    meals = _rows(meal_log(), user, first, last)
+    meal_type = match.group("meal_type")
+    if meal_type and not meals.empty:
+        meals = meals[meals["meal_type"].str.lower() == meal_type]
+    meal_words = f"{meal_type} " if meal_type else "meal "
+    if meals.empty:
+        return (f"It seems like there is no {meal_words}history available for you {label}.\n"
+                "Would you like to tell me what you ate so I can provide you with some personalized feedback or recommendations?")
+    lines = [
+        f"🍽️ {row.meal_type}: {row.meal}" if first == last else f"🍽️ {row.date} {row.meal_type}: {row.meal}"
+        for row in meals.tail(MAX_LISTED).itertuples(index=False)
+    ]
+    if len(meals) > MAX_LISTED:
+        lines.insert(0, f"(the last {MAX_LISTED} of {len(meals)} meals)")
+    return f"Here’s what you had {label}\n\n" + "\n".join(lines)
+
+
+def _stem(word):
+    # "bloated", "bloating" and "bloat" are the same symptom
+    return re.sub(r"(?:ing|ed|s)$", "", word.strip().lower())
+
+
+def _known_symptoms(user):
+    """Stems of the log form's symptoms and of every symptom `user` has logged."""
+    known = {_stem(symptom) for symptom in SYMPTOMS}
+    for log in (meal_log(), symptom_log()):
+        rows = log.for_user(user)
+        if not rows.empty:
+            for text in rows["symptoms"].unique():
+                known.update(_stem(felt) for felt in symptoms_of(text))
+    return known
+
+
+def _symptom_count(user, match, today):
+    words = match.group("rest").split()
+    known = _known_symptoms(user)
+    # A known symptom followed by a range we understand: "brain fog this week"
+    for split in range(1, len(words) + 1):
+        if _stem(" ".join(words[:split])) not in known:
+            continue
+        when = parse_range(" ".join(words[split:]), today)
+        if when is not None:
+            break
+    else:
+        return None
+    symptom = " ".join(words[:split])
+    first, last, label = when
+    wanted = _stem(symptom)
+    days = []
+    for log in (meal_log(), symptom_log()):
+        rows = _rows(log, user, first, last)
+        for row in rows.itertuples(index=False):
+            if any(_stem(felt) == wanted for felt in symptoms_of(row.symptoms)):
+                days.append(row.date)
+    where = f" {label}" if label else ""
+    if not days:
+        return f"You haven't logged {symptom}{where}." if label else f"You haven't logged {symptom} yet."
+    times = "once" if len(days) == 1 else f"{len(days)} times"
+    on_days = "" if len(set(days)) == len(days) else f" over {len(set(days))} different days"
+    return f"You logged {symptom} {times}{where}{on_days}; the last time was on {_long_date(date.fromisoformat(max(days)))}."
+
+
+def _known_food(food, meals):
+    """Whether the meal parser knows `food`: a synonym, a nutrient table food or one already logged."""
+    if food in meal_parser.KEEP_PLURAL or food in meal_parser.SYNONYMS.values():
+        return True
+    if get_table().lookup(food) is not None:
+        return True
+    return any(food in meal_parser.names_of(getattr(row, "ingredients", ""), row.meal)
+               for row in meals.itertuples(index=False))
+
+
+def _last_had(user, match, today):
+    items = meal_parser.parse_meal(match.group("food"))
+    # One food only; "rice and dal" or "too much sugar" are for the coach
+    if len(items) != 1:
+        return None
+    food = items[0].name
+    meals = _rows(meal_log(), user, None, today)
+    if not _known_food(food, meals):
+        return None
+    # Newest first; the log is sorted by date
+    for row in meals.iloc[::-1].itertuples(index=False):
+        names = meal_parser.names_of(getattr(row, "ingredients", ""), row.meal)
+        if any(f" {food} " in f" {name} " for name in names):
+            ago = (today - date.fromisoformat(row.date)).days
+            when = "today" if ago == 0 else "yesterday" if ago == 1 else f"{ago} days ago"
+            return f"You last had {food} on {_long_date(date.fromisoformat(row.date))} ({when}), for {row.meal_type.lower()}: {row.meal}"
+    return f"I can't find {food} in any meal you've logged."
+
+
+# (name, pattern, handler); the first pattern that matches and whose handler answers wins
+INTENTS = [
+    ("meals", _MEALS, _meals),
+    ("symptom_count", _SYMPTOM_COUNT, _symptom_count),
+    ("last_had", _LAST_HAD, _last_had),
+]
+
+
+def route(user, question, today=None):
+    """(intent, answer) for a question answered from the logs, or (None, None) for the coach."""
+    text = _TRAILING.sub("", " ".join(question.lower().replace("’", "'").split()))
+    today = today or date.today()
+    for name, pattern, handler in INTENTS:
+        match = pattern.search(text)
+        if match:
+            reply = handler(user, match, today)
+            if reply is not None:
+                return name, reply
+    return None, None
+
+
+def answer(user, question, today=None):
+    """The local answer to `question`, or None when it needs the coach; counted in stats()."""
+    global _misses
+    with span("local.answer") as s:
+        intent, reply = route(user, question, today)
+        s.set(intent=intent)
+    with _stats_lock:
+        if intent is None:
+            _misses += 1
+        else:
+            _hits[intent] = _hits.get(intent, 0) + 1
+    return reply
+
+
+def stats():
+    with _stats_lock:
+        hits = sum(_hits.values())
+        questions = hits + _misses
+        return {
+            "hits": hits,
+            "misses": _misses,
+            "hit_rate": hits / questions if questions else 0.0,
+            "intents": dict(_hits),
+        }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    intent, reply = route(sys.argv[1], " ".join(sys.argv[2:]))
+    if intent is None:
+        sys.exit("No intent matched; the coach would answer this one.")
+    print(f"[{intent}]\n{reply}")
@@ -0,0 +1,106 @@
+# log_cache.py
+import threading
+
+from meal_store import MEAL_LOG_FILE, MEAL_COLUMNS, load_cached
+from tracing import span
+
+SYMPTOM_LOG_FILE = "symptom_log.csv"
+SYMPTOM_COLUMNS = ["timestamp", "date", "name", "symptoms", "notes"]
+
+# path -> ((mtime_ns, size), IndexedLog); shared by every Streamlit session in this process
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class IndexedLog:
+    """A CSV log loaded once and indexed by user and by (user, date).
+
+    Frames handed out are shared between sessions and reruns, so callers must
+    not modify them in place.
+    """
+
+    def __init__(self, df):
+        if "date" in df.columns:
+            df = df.sort_values("date", kind="mergesort").reset_index(drop=True)
+        self.df = df
+        self.columns = list(df.columns)
+        if "name" in df.columns and not df.empty:
+            self._user_rows = df.groupby("name", sort=False).indices
+            self._date_rows = df.groupby(["name", "date"], sort=False).indices if "date" in df.columns else {}
+        else:
+            self._user_rows = {}
+            self._date_rows = {}
+        self._user_frames = {}
+        self._lock = threading.Lock()
+
+    @property
+    def empty(self):
+        return self.df.empty
+
+    def users(self):
+        return list(self._user_rows.keys())
+
+    def for_user(self, user, since=None):
+        """All rows for `user`, oldest date first; `since` drops dates before that ISO date."""
+        frame = self._user_frames.get(user)
+        if frame is None:
+            rows = self._user_rows.get(user)
+            frame = self.df.iloc[rows] if rows is not None else self.df.iloc[0:0]
+            with self._lock:
+                self._user_frames[user] = frame
+        if since:
+            return frame.iloc[frame["date"].searchsorted(since):]
+        return frame
+
+    def recent(self, user, n):
+        """`user`'s last `n` rows, oldest first."""
+        return self.for_user(user).tail(n)
+
+    def on_date(self, user, date_str):
+        """Rows for `user` on an ISO date string such as '2025-03-31'."""
+        rows = self._date_rows.get((user, date_str))
+        if rows is None:
+            return self.df.iloc[0:0]
+        return self.df.iloc[rows]
+
+
+def _read(path, columns):
+    # pandas is imported when a log is first read, so pages that never read one start faster
+    import pandas as pd
+
+    with span("log.read_csv", path=path) as s:
+        try:
+            df = pd.read_csv(path, dtype=str, keep_default_na=False)
+        except pd.errors.EmptyDataError:
+            df = pd.DataFrame(columns=columns)
+        for col in columns:
+            if col not in df.columns:
+                df[col] = ""
+        s.set(rows=len(df))
+    return df
+
+
+def load_log(path, columns):
+    """Return the cached IndexedLog for `path`, reloading only if the file changed."""
+    try:
+        return load_cached(path, _cache, lambda path: IndexedLog(_read(path, columns)), _cache_lock)
+    except FileNotFoundError:
+        import pandas as pd
+
+        return IndexedLog(pd.DataFrame(columns=columns))
+
+
+def meal_log(path=MEAL_LOG_FILE):
+    return load_log(path, MEAL_COLUMNS)
+
+
+def symptom_log(path=SYMPTOM_LOG_FILE):
+    return load_log(path, SYMPTOM_COLUMNS)
+
+
+def invalidate(path=None):
+    with _cache_lock:
+        if path is None:
+            _cache.clear()
+        else:
+            _cache.pop(path, None)
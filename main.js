@@ -1,6 +1,9 @@
 const { app, BrowserWindow } = require('electron');
 const path = require('path');
 const { spawn } = require('child_process');
+const http = require('http');
+
+const HEALTH_URL = 'http://localhost:8501/_stcore/health';
 
 function createWindow () {
   const win = new BrowserWindow({
@@ -14,6 +17,25 @@ function createWindow () {
   win.loadURL('http://localhost:8501');
 }
 
+// Poll Streamlit's health check and open the window as soon as it answers
+function waitForStreamlit(onReady, attempts = 150) {
+  const retry = () => {
+    if (attempts > 1) {
+      setTimeout(() => waitForStreamlit(onReady, attempts - 1), 200);
+    } else {
+      console.error('Streamlit did not become ready on port 8501');
+    }
+  };
+  http.get(HEALTH_URL, (res) => {
+    res.resume();
+    if (res.statusCode === 200) {
+      onReady();
+    } else {
+      retry();
+    }
+  }).on('error', retry);
+}
+
 app.whenReady().then(() => {
   // Start the Streamlit server
   spawn('streamlit', ['run', 'Nutrition_Assistant.py'], {
@@ -22,5 +44,5 @@ app.whenReady().then(() => {
     stdio: 'inherit'
   });
 
-  createWindow();
+  waitForStreamlit(createWindow);
 });
@@ -0,0 +1,177 @@
+# meal_parser.py
+"""Split free-text meals into normalised ingredients with quantities.
+
+    "2 rotis, paneer & a bowl of dal"  ->  roti x2, paneer x1, dal x1 bowl
+    "Roti x2"                          ->  roti x2
+
+Names are lower-cased, stripped of descriptors like "fresh", made singular
+and mapped through SYNONYMS, so "Chapatis", "roti" and "phulka" all count as
+"roti". storage.append_meal stores the result next to each row in the
+compact form encode() produces ("roti:2;paneer:1;dal:1bowl"), so insights
+and scoring read it back with decode() instead of parsing the text again.
+
+Usage:
+    python meal_parser.py "2 rotis, paneer & a bowl of dal"
+"""
+import re
+import sys
+from collections import namedtuple
+from functools import lru_cache
+
+# Bump when parsing changes, so stored counters built from older names are rebuilt
+PARSER_VERSION = 1
+
+# Same separators symptom_insights has always split on, plus new lines
+_SPLIT = re.compile(r"\s*(?:,|;|\+|&|\n|\band\b|\bwith\b)\s*")
+
+WORD_NUMBERS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "half": 0.5, "½": 0.5, "¼": 0.25, "¾": 0.75, "couple of": 2, "few": 3,
+}
+UNITS = {
+    "g": "g", "gm": "g", "gms": "g", "gram": "g", "grams": "g", "kg": "kg",
+    "ml": "ml", "l": "l", "litre": "l", "litres": "l", "liter": "l", "liters": "l",
+    "cup": "cup", "cups": "cup", "bowl": "bowl", "bowls": "bowl", "plate": "plate", "plates": "plate",
+    "glass": "glass", "glasses": "glass", "slice": "slice", "slices": "slice",
+    "tbsp": "tbsp", "tablespoon": "tbsp", "tablespoons": "tbsp", "tsp": "tsp", "teaspoon": "tsp", "teaspoons": "tsp",
+    "handful": "handful", "handfuls": "handful", "scoop": "scoop", "scoops": "scoop",
+    # Plain counts
+    "piece": "", "pieces": "", "pc": "", "pcs": "", "serving": "", "servings": "",
+}
+# Words in front of a food that do not change what it is
+DESCRIPTORS = {"fresh", "homemade", "plain", "small", "medium", "large", "big", "extra", "some", "few", "little", "bit", "of"}
+# Foods only ever named in the plural
+KEEP_PLURAL = {
+    "oats", "peas", "chips", "fries", "noodles", "sprouts", "greens", "lentils", "cornflakes", "nuts",
+    "berries", "grapes", "dates", "almonds", "walnuts", "peanuts", "cashews", "crackers", "vegetables",
+    "mixed vegetables", "scrambled eggs", "french fries", "rice cakes", "chia seeds", "strawberries",
+}
+SYNONYMS = {
+    "chapati": "roti", "chapatti": "roti", "phulka": "roti", "fulka": "roti", "rotli": "roti",
+    "dahi": "curd", "yoghurt": "yogurt", "daal": "dal", "dhal": "dal", "chawal": "rice",
+    "white rice": "rice", "steamed rice": "rice", "kidney bean": "rajma", "chickpea": "chana",
+    "chhole": "chole", "aloo": "potato", "okra": "bhindi", "lady finger": "bhindi", "palak": "spinach",
+    "brinjal": "eggplant", "aubergine": "eggplant", "capsicum": "bell pepper", "cottage cheese": "paneer",
+    "coke": "cola", "spaghetti": "pasta", "macaroni": "pasta", "maggi": "noodles", "veggies": "vegetables",
+    "fries": "french fries", "crisps": "chips",
+}
+
+_NUMBER = r"\d+/\d+|\d+(?:\.\d+)?|(?:" + "|".join(sorted(map(re.escape, WORD_NUMBERS), key=len, reverse=True)) + r")\b"
+_UNIT = "|".join(sorted(map(re.escape, UNITS), key=len, reverse=True))
+# "2 rotis", "200g rice", "a bowl of dal", "2x roti", "half cup of curd"
+_LEADING = re.compile(rf"^(?P<qty>{_NUMBER})\s*(?:x\s+)?(?:(?P<unit>{_UNIT})\b\.?\s*)?(?:of\s+)?(?=\S)")
+# "roti x2", "roti x 2", "roti * 2", "roti (2)"
+_TRAILING = re.compile(r"\s*(?:[x×*]\s*(?P<qty>\d+(?:\.\d+)?)|\((?P<paren>\d+(?:\.\d+)?)\))$")
+_PARENTHESES = re.compile(r"\([^)]*\)")
+_NOT_NAME = re.compile(r"[^a-z0-9' -]+")
+_STORED_ITEM = re.compile(r"^(?P<name>[^:]+):(?P<qty>[\d.]+)(?P<unit>[a-z]*)$")
+
+Item = namedtuple("Item", ["name", "quantity", "unit"])
+
+
+def _number(text):
+    if text in WORD_NUMBERS:
+        return WORD_NUMBERS[text]
+    if "/" in text:
+        top, bottom = text.split("/")
+        return int(top) / int(bottom) if int(bottom) else 1
+    return float(text)
+
+
+def singular(name):
+    """`name` with its last word made singular, unless the food is only named in the plural."""
+    if name in KEEP_PLURAL or name in SYNONYMS:
+        return name
+    head, _, word = name.rpartition(" ")
+    if len(word) <= 3 or word.endswith(("ss", "us")):
+        return name
+    if word.endswith("ies"):
+        word = word[:-3] + "y"
+    elif word.endswith(("oes", "ches", "shes", "xes")):
+        word = word[:-2]
+    elif word.endswith("s"):
+        word = word[:-1]
+    return f"{head} {word}" if head else word
+
+
+def normalise(name):
+    """Canonical ingredient name: lower case, no descriptors, singular, synonyms resolved."""
+    words = _NOT_NAME.sub(" ", name.lower()).split()
+    while len(words) > 1 and words[0] in DESCRIPTORS:
+        words.pop(0)
+    name = singular(" ".join(words))
+    return SYNONYMS.get(name, name)
+
+
+def _parse_part(part):
+    quantity, unit = 1.0, ""
+    match = _TRAILING.search(part)
+    if match:
+        quantity = float(match.group("qty") or match.group("paren"))
+        part = part[:match.start()]
+    part = _PARENTHESES.sub("", part).strip()
+    match = _LEADING.match(part)
+    if match:
+        quantity *= _number(match.group("qty"))
+        unit = UNITS.get(match.group("unit") or "", "")
+        part = part[match.end():]
+    name = normalise(part)
+    return Item(name, quantity, unit) if name else None
+
+
+@lru_cache(maxsize=8192)
+def parse_meal(meal_text):
+    """Items of a free-text meal, in order of first mention; repeats of one food and unit are added up."""
+    items = {}
+    for part in _SPLIT.split((meal_text or "").lower()):
+        item = _parse_part(part.strip())
+        if item is None:
+            continue
+        key = (item.name, item.unit)
+        if key in items:
+            items[key] = items[key]._replace(quantity=items[key].quantity + item.quantity)
+        else:
+            items[key] = item
+    return tuple(items.values())
+
+
+def encode(items):
+    """Compact stored form of parsed items, e.g. 'roti:2;dal:1bowl'."""
+    return ";".join(f"{item.name}:{item.quantity:g}{item.unit}" for item in items)
+
+
+@lru_cache(maxsize=8192)
+def decode(stored):
+    """Items back from encode()'s form."""
+    items = []
+    for field in stored.split(";") if stored else []:
+        match = _STORED_ITEM.match(field)
+        if match:
+            items.append(Item(match.group("name"), float(match.group("qty")), match.group("unit")))
+    return tuple(items)
+
+
+def ingredients(meal_text):
+    """The stored form for a meal, as written next to it in the meal log."""
+    return encode(parse_meal(meal_text))
+
+
+@lru_cache(maxsize=8192)
+def ingredient_names(stored):
+    """Distinct ingredient names in a stored ingredients value, sorted."""
+    return tuple(sorted({item.name for item in decode(stored)}))
+
+
+def names_of(stored, meal_text=""):
+    """Ingredient names of one logged meal: the stored ones, or parsed from the text for older rows."""
+    return ingredient_names(stored or ingredients(meal_text))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    meal = " ".join(sys.argv[1:])
+    for item in parse_meal(meal):
+        print(f"{item.name:<24} {item.quantity:g} {item.unit}".rstrip())
+    print(f"stored as: {ingredients(meal)}")
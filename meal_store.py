@@ -0,0 +1,182 @@
+# meal_store.py
+import csv
+import json
+import os
+import threading
+from contextlib import contextmanager, nullcontext
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl; fall back to the in-process lock only
+    fcntl = None
+
+MEAL_LOG_FILE = "meal_log.csv"
+# ingredients holds the parsed meal (see meal_parser.py), written when the row is logged
+MEAL_COLUMNS = ["timestamp", "date", "name", "meal", "meal_type", "symptoms", "notes", "ingredients"]
+
+# Header of every log file whose schema was already checked in this process
+_headers = {}
+# One thread lock per locked path, so writers to different files never wait on each other
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+
+
+# --- Locking ---
+def _thread_lock(path):
+    with _path_locks_guard:
+        return _path_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+@contextmanager
+def locked(path=MEAL_LOG_FILE):
+    """Hold an exclusive lock on `path` (threads of this process and other processes)."""
+    with _thread_lock(path):
+        with open(path + ".lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# --- Atomic writes and cached reads ---
+@contextmanager
+def atomic_file(path, **open_args):
+    """A new file to write in place of `path`; it replaces `path` only if the block succeeds.
+
+    Each process and thread writes its own temporary file, so two writers
+    never tear each other's, and readers only ever see a complete file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", **open_args) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_json(path, data):
+    with atomic_file(path) as f:
+        json.dump(data, f, separators=(",", ":"))
+
+
+def read_json(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def file_version(path):
+    """(mtime_ns, size) of `path`; it changes whenever the file is rewritten or appended to."""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def load_cached(path, cache, load=read_json, lock=None):
+    """`load(path)`, kept in `cache` (path -> (version, value)) until the file changes.
+
+    Raises FileNotFoundError if `path` does not exist. With `lock`, only one
+    thread loads a changed file while the others wait for its result.
+    """
+    version = file_version(path)
+    cached = cache.get(path)
+    if cached and cached[0] == version:
+        return cached[1]
+    with lock or nullcontext():
+        cached = cache.get(path)
+        if cached and cached[0] == version:
+            return cached[1]
+        value = load(path)
+        cache[path] = (version, value)
+        return value
+
+
+# --- Schema repair (runs once per file per process) ---
+def _repair(path, columns):
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        rows = list(reader)
+
+    # Blank header cells are dropped together with their values, so later columns stay aligned
+    keep = [i for i, col in enumerate(header) if col]
+    header = [header[i] for i in keep] + [col for col in columns if col not in header]
+    with atomic_file(path, newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(header)
+        for row in rows:
+            if not any(row):
+                continue
+            # Pad short rows, drop stray trailing fields from corrupted lines
+            kept = [row[i] if i < len(row) else "" for i in keep]
+            writer.writerow(kept + [""] * (len(header) - len(kept)))
+    return header
+
+
+def _ensure_schema(path, columns):
+    if path in _headers and os.path.exists(path):
+        return _headers[path]
+
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f, lineterminator="\n").writerow(columns)
+        header = list(columns)
+    else:
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            header = next(csv.reader(f), [])
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            ends_with_newline = f.read(1) == b"\n"
+        if any(col not in header for col in columns) or "" in header or not ends_with_newline:
+            header = _repair(path, columns)
+
+    _headers[path] = header
+    return header
+
+
+def open_log(path=MEAL_LOG_FILE, columns=MEAL_COLUMNS):
+    """Create the log or add missing columns to it; returns the file's header."""
+    with locked(path):
+        return _ensure_schema(path, columns)
+
+
+# --- Writing ---
+def append_row(entry, path=MEAL_LOG_FILE, columns=MEAL_COLUMNS):
+    """Append one row to a CSV log without reading the rest of the file."""
+    with locked(path):
+        header = _ensure_schema(path, columns)
+        with open(path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=header, restval="", extrasaction="ignore", lineterminator="\n")
+            writer.writerow(entry)
+
+
+def append_meal(entry, path=MEAL_LOG_FILE):
+    append_row(entry, path, MEAL_COLUMNS)
+
+
+# --- Compaction ---
+def remove_rows(path, columns, drop):
+    """Rewrite a CSV log without the rows for which `drop(row)` is true; returns how many went."""
+    if not os.path.exists(path):
+        return 0
+    with locked(path):
+        header = _ensure_schema(path, columns)
+        removed = 0
+        tmp_path = path + ".tmp"
+        with open(path, "r", newline="", encoding="utf-8") as src, open(tmp_path, "w", newline="", encoding="utf-8") as dst:
+            writer = csv.DictWriter(dst, fieldnames=header, restval="", extrasaction="ignore", lineterminator="\n")
+            writer.writeheader()
+            for row in csv.DictReader(src):
+                if drop(row):
+                    removed += 1
+                else:
+                    writer.writerow(row)
+        if removed:
+            os.replace(tmp_path, path)
+        else:
+            os.remove(tmp_path)
+        return removed
@@ -1,15 +1,7 @@
 # utils/meal_utils.py
 from datetime import datetime, date
-import pandas as pd
-import os
-from config import MEAL_LOG_FILE
-
-def calculate_nutritional_score(meal_text):
-    calories = 200
-    protein = 15
-    fat = 10
-    carbs = 30
-    return 100 - abs(50 - protein) - abs(50 - carbs) - abs(50 - fat)
+from storage import append_meal, meal_log
+from insight_store import record_row
 
 def log_meal(name, meal, meal_type):
     log_entry = {
@@ -19,15 +11,8 @@ def log_meal(name, meal, meal_type):
         "meal": meal,
         "meal_type": meal_type
     }
-
-    df = pd.DataFrame([log_entry])
-    if os.path.exists(MEAL_LOG_FILE):
-        df.to_csv(MEAL_LOG_FILE, mode='a', header=False, index=False)
-    else:
-        df.to_csv(MEAL_LOG_FILE, mode='w', header=True, index=False)
+    append_meal(log_entry)
+    record_row(log_entry)
 
 def get_today_meals(name):
-    if os.path.exists(MEAL_LOG_FILE):
-        df = pd.read_csv(MEAL_LOG_FILE)
-        return df[(df["date"] == str(date.today())) & (df["name"] == name)]
-    return pd.DataFrame()
\ No newline at end of file
+    return meal_log().on_date(name, str(date.today()))
\ No newline at end of file
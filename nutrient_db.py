@@ -0,0 +1,174 @@
+# nutrient_db.py
+"""Per-food macros and a gluten flag, looked up locally.
+
+nutrients.json stores the table column by column (one list per field, per
+serving of each food) plus aliases such as "dahi" -> "curd". It is loaded
+once per process into a dict from food name to row number, so a lookup is a
+hash lookup; names that miss are matched to the closest known food, and the
+answer is cached. Meals come in already split by meal_parser, so amounts in
+grams or millilitres are scaled against each food's serving size.
+
+Usage:
+    python nutrient_db.py "2 rotis, paneer, salad"
+"""
+import difflib
+import json
+import re
+import sys
+import threading
+from collections import namedtuple
+from functools import lru_cache
+
+from meal_parser import decode, parse_meal
+
+NUTRIENT_FILE = "nutrients.json"
+MACROS = ["kcal", "protein", "carbs", "fat", "fiber"]
+# How alike a name must be to a known food to count as it (difflib ratio)
+FUZZY_CUTOFF = 0.82
+
+# Share of the meal's energy each macro should provide, as (low, high)
+ENERGY_TARGETS = {"protein": (0.10, 0.35), "carbs": (0.45, 0.65), "fat": (0.20, 0.35)}
+KCAL_PER_GRAM = {"protein": 4, "carbs": 4, "fat": 9}
+FIBER_TARGET = 8  # grams per meal for the full fibre bonus
+
+# Grams (or millilitres) in one of each unit; other units count as servings
+UNIT_GRAMS = {"g": 1, "ml": 1, "kg": 1000, "l": 1000}
+_SERVING_GRAMS = re.compile(r"(\d+(?:\.\d+)?)\s*(?:g|ml)\b")
+
+Food = namedtuple("Food", ["name", "serving", "kcal", "protein", "carbs", "fat", "fiber", "gluten"])
+MealNutrition = namedtuple("MealNutrition", MACROS + ["gluten_foods", "matched", "unknown"])
+
+
+class NutrientTable:
+    """The nutrient columns plus a name -> row index over foods and aliases."""
+
+    def __init__(self, data):
+        self.columns = data["columns"]
+        foods = self.columns["food"]
+        self._rows = {name: row for row, name in enumerate(foods)}
+        for alias, name in data.get("aliases", {}).items():
+            self._rows[alias] = self._rows[name]
+        self._names = list(self._rows)
+        self.grams = [_serving_grams(serving) for serving in self.columns["serving"]]
+
+    def __len__(self):
+        return len(self.columns["food"])
+
+    def food(self, row):
+        return Food(self.columns["food"][row], *(self.columns[field][row] for field in Food._fields[1:]))
+
+    def row(self, name):
+        """Row of `name`: exact, then singular, then the closest known name; None if nothing is close."""
+        row = self._rows.get(name)
+        if row is None:
+            row = self._fuzzy_row(name)
+        return row
+
+    def servings(self, row, item):
+        """How many servings of food `row` a parsed meal item stands for."""
+        grams = UNIT_GRAMS.get(item.unit)
+        if grams is None or self.grams[row] is None:
+            return item.quantity
+        return item.quantity * grams / self.grams[row]
+
+    @lru_cache(maxsize=4096)
+    def _fuzzy_row(self, name):
+        # The table names some foods in the plural ("grapes") and the parser makes names singular
+        for other in _other_forms(name):
+            if other in self._rows:
+                return self._rows[other]
+        match = difflib.get_close_matches(name, self._names, n=1, cutoff=FUZZY_CUTOFF)
+        return self._rows[match[0]] if match else None
+
+    def lookup(self, name):
+        """The Food called `name` (any case, plural or close spelling), or None."""
+        row = self.row(" ".join(name.lower().split()))
+        return None if row is None else self.food(row)
+
+
+def _other_forms(name):
+    if name.endswith("y"):
+        yield name[:-1] + "ies"
+    yield name + "s"
+    yield name + "es"
+    if name.endswith("s"):
+        yield name[:-1]
+
+
+def _serving_grams(serving):
+    match = _SERVING_GRAMS.search(serving)
+    return float(match.group(1)) if match else None
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_table():
+    """Process-wide NutrientTable, loaded from NUTRIENT_FILE on first use."""
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                with open(NUTRIENT_FILE, "r", encoding="utf-8") as f:
+                    _table = NutrientTable(json.load(f))
+    return _table
+
+
+@lru_cache(maxsize=4096)
+def meal_nutrition(items):
+    """Summed macros of parsed meal items (see meal_parser), plus which foods were recognised."""
+    table = get_table()
+    totals = dict.fromkeys(MACROS, 0.0)
+    gluten_foods, matched, unknown = [], [], []
+    for item in items:
+        row = table.row(item.name)
+        if row is None:
+            unknown.append(item.name)
+            continue
+        food = table.food(row)
+        servings = table.servings(row, item)
+        for macro in MACROS:
+            totals[macro] += servings * getattr(food, macro)
+        matched.append(food.name)
+        if food.gluten:
+            gluten_foods.append(food.name)
+    return MealNutrition(**{macro: round(value, 1) for macro, value in totals.items()},
+                         gluten_foods=tuple(gluten_foods), matched=tuple(matched), unknown=tuple(unknown))
+
+
+def score(nutrition):
+    """0-100: how well the macro split fits ENERGY_TARGETS, with a bonus for fibre; None if nothing was recognised."""
+    energy = {macro: getattr(nutrition, macro) * KCAL_PER_GRAM[macro] for macro in ENERGY_TARGETS}
+    total = sum(energy.values())
+    if not nutrition.matched or total <= 0:
+        return None
+    penalty = 0.0
+    for macro, (low, high) in ENERGY_TARGETS.items():
+        share = energy[macro] / total
+        penalty += max(low - share, 0, share - high)
+    fiber_bonus = 10 * min(nutrition.fiber / FIBER_TARGET, 1)
+    return max(0, min(100, round(90 - 150 * penalty + fiber_bonus)))
+
+
+def calculate_nutritional_score(meal_text, stored=""):
+    """Nutritional quality score of a meal, or None if no food in it is known.
+
+    `stored` is the meal's ingredients as logged; the text is only parsed without it.
+    """
+    return score(meal_nutrition(decode(stored) if stored else parse_meal(meal_text.strip())))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    meal = " ".join(sys.argv[1:])
+    nutrition = meal_nutrition(parse_meal(meal))
+    print(f"{meal}: score {calculate_nutritional_score(meal)}")
+    print("  " + ", ".join(f"{macro} {getattr(nutrition, macro)}" for macro in MACROS))
+    print(f"  recognised: {', '.join(nutrition.matched) or 'nothing'}")
+    if nutrition.unknown:
+        print(f"  unknown: {', '.join(nutrition.unknown)}")
+    if nutrition.gluten_foods:
+        print(f"  contains gluten: {', '.join(nutrition.gluten_foods)}")
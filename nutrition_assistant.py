@@ -1,14 +1,20 @@
 import streamlit as st
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
-from datetime import datetime, date
-import pandas as pd
-import pandas.errors
 import json
-import html
+import uuid
+from storage import load_user_profiles
+from utils import get_meal_symptom_insight, get_memory_context
+from llm_client import DEFAULT_MODEL
+from response_cache import cache_key, get_cache
+import llm_worker
+import local_answers
+from prompt_budget import PROMPT_TOKEN_CEILING, Section, count_tokens, fit_sections, record_usage
+from conversation_memory import ConversationMemory
+from chat_render import render_transcript
+from startup import warm_up
+from tracing import TRACE_FILE, end_rerun, enabled as tracing_enabled, set_enabled as set_tracing, span, start_rerun
 
 st.set_page_config(page_title="🥗 Nutrition Assistant", layout="centered")
+start_rerun("chat")
 
 st.markdown('<link href="https://fonts.googleapis.com/css2?family=Poppins:wght@400;600;700&display=swap" rel="stylesheet">', unsafe_allow_html=True)
 
@@ -20,166 +26,30 @@ def load_css(file_path="style.css"):
 
 
 
-# Load API key
-load_dotenv()
-api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key)
-
-USER_FILE = "user_profiles.json"
-REPORT_FILE = "report_memory.txt"
-MEAL_LOG_FILE = "meal_log.csv"
-SYMPTOM_LOG_FILE = "symptom_log.csv"
 
 
 # --- Define base context ---
 def get_base_context(user_name):
     return st.session_state.user_profiles.get(user_name, f"{user_name} is a new user. Please ask questions to help personalize health suggestions.")
 
-# --- Helper: Load meals + reports for memory ---
-def get_memory_context(user):
-    memory = ""
-
-    if os.path.exists(MEAL_LOG_FILE):
-        try:
-            df = pd.read_csv(MEAL_LOG_FILE)
-
-            user_logs = df[df["name"] == user]
-
-            if not user_logs.empty:
-                latest_logs = user_logs.sort_values(by="date", ascending=False).head(5)
-
-                memory += f"Here are the last 5 meals logged by {user}:\n"
-                for _, row in latest_logs.iterrows():
-                    meal_info = f"- {row['date']}: {row['meal_type']} – {row['meal']}"
-                    memory += meal_info + "\n"
-
-        except pd.errors.EmptyDataError:
-            memory += "(Meal log exists but is empty.)\n"
-
-    if os.path.exists(REPORT_FILE):
-        with open(REPORT_FILE, "r") as f:
-            lines = f.readlines()[-10:]
-            memory += "\nReport Summary (latest 10 lines):\n" + "".join(lines)
-
-    return memory.strip()
-def get_meal_by_date(user, target_date_str):
-    """Search meal log for a specific date (e.g., '31 March' or '2025-03-31')"""
-    if not os.path.exists(MEAL_LOG_FILE):
-        return None
-
-    try:
-        df = pd.read_csv(MEAL_LOG_FILE)
-        df = df[df["name"] == user]
-
-        # Normalize the date input
-        try:
-            if not target_date_str.strip().startswith("202"):
-                target_date = datetime.strptime(target_date_str.strip(), "%d %B").replace(year=date.today().year)
-            else:
-                target_date = datetime.strptime(target_date_str.strip(), "%Y-%m-%d")
-        except:
-            return None
-
-        # Format target date string
-        date_str = target_date.strftime("%Y-%m-%d")
-
-        matching = df[df["date"] == date_str]
-
-        if matching.empty:
-            return None
-
-        result = f"Meals logged on {date_str}:\n"
-        for _, row in matching.iterrows():
-            result += f"- {row['meal_type']}: {row['meal']}\n"
-        return result.strip()
-
-    except Exception as e:
-        return f"Error checking date-based meals: {e}"
-
-
-
-def get_meal_symptom_insight(user):
-    if not os.path.exists(MEAL_LOG_FILE) or not os.path.exists(SYMPTOM_LOG_FILE):
-        return "Not enough data yet to analyze meal and symptom correlations."
-
-    try:
-        meals = pd.read_csv(MEAL_LOG_FILE)
-        symptoms = pd.read_csv(SYMPTOM_LOG_FILE)
-
-        meals = meals[meals["name"] == user]
-        symptoms = symptoms[symptoms["name"] == user]
-
-        combined = pd.merge(meals, symptoms, on="date", how="inner")
-        if combined.empty:
-            return "No overlapping meal and symptom data found yet."
-
-        symptom_counts = {}
-        for _, row in combined.iterrows():
-            meal = row["meal"].lower()
-            symptom_list = row["symptoms"].split(", ")
-            for symptom in symptom_list:
-                symptom_counts.setdefault(symptom, []).append(meal)
-
-        insight = ""
-        for symptom, meals_triggered in symptom_counts.items():
-            meal_summary = pd.Series(meals_triggered).value_counts().head(2)
-            insight += f"🔁 **{symptom}** has occurred after meals like:\n"
-            for meal, count in meal_summary.items():
-                insight += f"• {meal} ({count} times)\n"
-            insight += "\n"
-
-        return insight.strip()
-
-    except Exception as e:
-        return f"Error analyzing symptom insight: {e}"
-
-
-        # Build insight text
-        insight = ""
-        for symptom, meals_triggered in symptom_counts.items():
-            meal_summary = pd.Series(meals_triggered).value_counts().head(2)
-            insight += f"🔁 **{symptom}** has occurred after meals like:\n"
-            for meal, count in meal_summary.items():
-                insight += f"• {meal} ({count} times)\n"
-            insight += "\n"
-
-        return insight.strip()
-
-    except Exception as e:
-        return f"Error analyzing symptom insight: {e}"
-
-
-        # Build insight text
-        insight = ""
-        for symptom, meals_triggered in symptom_counts.items():
-            meal_summary = pd.Series(meals_triggered).value_counts().head(2)
-            insight += f"🔁 **{symptom}** has occurred after meals like:\n"
-            for meal, count in meal_summary.items():
-                insight += f"• {meal} ({count} times)\n"
-            insight += "\n"
-
-        return insight.strip()
-
-    except Exception as e:
-        return f"Error analyzing symptom insight: {e}"
-
 
 # --- Session State Initialization ---
-def load_user_profiles():
-    if os.path.exists(USER_FILE):
-        with open(USER_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_user_profiles():
-    with open(USER_FILE, "w") as f:
-        json.dump(st.session_state.user_profiles, f)
-
 if "users" not in st.session_state:
     st.session_state.user_profiles = load_user_profiles()
     st.session_state.users = list(st.session_state.user_profiles.keys())
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = {}
+if "conversation_memory" not in st.session_state:
+    st.session_state.conversation_memory = {}
+if "session_id" not in st.session_state:
+    # Names this browser session's inbox in llm_worker
+    st.session_state.session_id = uuid.uuid4().hex
+if "pending_replies" not in st.session_state:
+    # user -> key of the coach job still answering them
+    st.session_state.pending_replies = {}
+if "last_question" not in st.session_state:
+    # user -> question already handled; the text box keeps it across reruns
+    st.session_state.last_question = {}
 
 # --- Main Page Setup ---
 
@@ -245,6 +115,12 @@ with st.sidebar:
     </style>
     """, unsafe_allow_html=True)
 
+    st.checkbox("Stream coach replies", value=True, key="stream_replies")
+    st.checkbox("Skip reply cache", value=False, key="bypass_reply_cache")
+    st.checkbox("Trace reruns", value=tracing_enabled(), key="trace_reruns",
+                on_change=lambda: set_tracing(st.session_state.trace_reruns),
+                help=f"Times every rerun of every session into {TRACE_FILE}")
+
 
 
 
@@ -307,63 +183,8 @@ if current_user:
     if current_user not in st.session_state.chat_history:
         st.session_state.chat_history[current_user] = []
 
-import re
-from dateutil import parser
-
-def extract_meal_query_date(user_input: str):
-    # Look for a pattern like "what did I eat on 31 March"
-    match = re.search(r"what did i eat on ([\w\s]+)", user_input.lower())
-    if match:
-        try:
-            parsed_date = parser.parse(match.group(1), fuzzy=True).date()
-            return parsed_date
-        except Exception:
-            return None
-    return None
-
-# --- Updated Chat Section ---#
-import html  # Ensure HTML escaping for dynamic content
-
-if current_user:
-    # Add a placeholder that disappears when the user begins typing
-    user_input = st.text_input(
-        label="",  # No label to avoid extra text
-        placeholder="Type your question here..."  # Placeholder text inside the input field
-    )
-    if current_user not in st.session_state.chat_history:
-        st.session_state.chat_history[current_user] = []
-
-    # Check if the input contains a meal date query
-    query_date = extract_meal_query_date(user_input)
-
-    if query_date:
-        try:
-            if os.path.exists(MEAL_LOG_FILE):
-                meal_df = pd.read_csv(MEAL_LOG_FILE)
-                meal_df["date"] = pd.to_datetime(meal_df["date"]).dt.date
-
-                filtered = meal_df[(meal_df["name"] == current_user) & (meal_df["date"] == query_date)]
-
-                if not filtered.empty:
-                    meal_list = "\n".join([
-                        f"🍽️ {row['meal_type']}: {row['meal']}" for _, row in filtered.iterrows()
-                    ])
-                    answer = f"Here’s what you had on {query_date.strftime('%B %d, %Y')}\n\n{meal_list}"
-                else:
-                    answer = f"It seems like there is no meal history available for you on {query_date.strftime('%B %d, %Y')}.\nWould you like to tell me what you ate on that day so I can provide you with some personalized feedback or recommendations?"
-
-                st.session_state.chat_history[current_user].append(("You", user_input))
-                st.session_state.chat_history[current_user].append(("Coach", answer))
-
-        except Exception as e:
-            st.error(f"⚠️ Error reading meal data: {e}")
-
-    elif user_input:
-        try:
-            user_context = get_base_context(current_user)
-            memory_context = get_memory_context(current_user)
-            symptom_insight = get_meal_symptom_insight(current_user)
-            full_context = f"""
+# System prompt for the coach; the three sections are trimmed to fit the token ceiling
+COACH_PROMPT = """
 You are a proactive, friendly, and observant nutritionist assistant named Gluteny.
 
 Your role is to help the user build better food habits, avoid discomfort, and feel good through diet adjustments.
@@ -387,74 +208,139 @@ Your role is to help the user build better food habits, avoid discomfort, and fe
 - Keep your tone warm, conversational, and human-like — like a coach who truly cares.
 """
 
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": full_context},
-                    {"role": "user", "content": user_input},
-                ]
-            )
 
-            answer = response.choices[0].message.content.strip()
-            st.session_state.chat_history[current_user].append(("You", user_input))
-            st.session_state.chat_history[current_user].append(("Coach", answer))
+# --- Updated Chat Section ---#
 
-        except Exception as e:
-            st.error(f"⚠️ Error: {e}")
+REPLY_POLL_SECONDS = 0.5
+
+
+def pick_up_reply(user):
+    """Move `user`'s coach reply from the worker's inbox into the chat once it is finished."""
+    key = st.session_state.pending_replies.get(user)
+    if key is None:
+        return
+    if key not in llm_worker.inbox(st.session_state.session_id):
+        # Expired from the inbox, e.g. after a long time away
+        del st.session_state.pending_replies[user]
+        return
+    job = llm_worker.collect(st.session_state.session_id, key)
+    if job is None:
+        return
+    del st.session_state.pending_replies[user]
+    if job.status == llm_worker.DONE:
+        st.session_state.chat_history[user].append(("Coach", job.answer))
+    elif job.status == llm_worker.FAILED:
+        st.error(f"⚠️ Error: {job.error}")
+
+
+@st.fragment(run_every=REPLY_POLL_SECONDS)
+def show_pending_reply(user):
+    """The reply so far, refreshed on its own while the rest of the page stays put."""
+    key = st.session_state.pending_replies.get(user)
+    job = llm_worker.inbox(st.session_state.session_id).get(key) if key else None
+    if job is None or job.finished:
+        # A full rerun moves the reply into the transcript
+        st.rerun()
+    st.markdown(f"**Coach:** {job.partial}▌" if job.partial else "**Coach** is thinking…")
+    if st.button("⏹️ Stop reply", key="stop_reply"):
+        llm_worker.cancel(st.session_state.session_id, key)
+        st.session_state.pending_replies.pop(user, None)
+        st.rerun()
 
-# --- Styled chat display ---
-# --- Display chat with scrollable container ---
-import html  # Ensure HTML escaping for dynamic content
 
-if current_user and current_user in st.session_state.chat_history:
-    chat_html = """
-    <style>
-    .chat-container {
-        max-height: 400px;
-        overflow-y: auto;
-        padding: 1rem;
-        background-color: rgba(28, 28, 28, 0.95);
-        border-radius: 1rem;
-        border: 1px solid rgba(255, 255, 255, 0.1);
-        box-shadow: 0 0 12px rgba(0,255,100,0.1);
-        backdrop-filter: blur(4px);
-        margin-bottom: 1rem;
-    }
-    .user-msg {
-        background-color: rgba(60,60,60,0.8);
-        padding: 1rem;
-        border-radius: 1rem;
-        margin-bottom: 1rem;
-        max-width: 80%;
-        margin-left: auto;
-        text-align: right;
-        color: #ffffff !important;
-        font-size: 1rem;
-    }
-    .bot-msg {
-        background-color: rgba(46,204,113,0.3);
-        padding: 1rem;
-        border-radius: 1rem;
-        margin-bottom: 1rem;
-        max-width: 80%;
-        margin-right: auto;
-        text-align: left;
-        color: #ffffff !important;
-        font-size: 1rem;
-    }
-    </style>
-    <div class="chat-container">
-    """
+if current_user:
+    # Add a placeholder that disappears when the user begins typing
+    user_input = st.text_input(
+        label="",  # No label to avoid extra text
+        placeholder="Type your question here..."  # Placeholder text inside the input field
+    )
+    if current_user not in st.session_state.chat_history:
+        st.session_state.chat_history[current_user] = []
+
+    # Reruns keep the text in the box, so only a question not handled yet is asked
+    new_question = bool(user_input) and st.session_state.last_question.get(current_user) != user_input
+    if new_question:
+        st.session_state.last_question[current_user] = user_input
+
+    # Questions about the user's own log are answered from it; the rest go to the coach
+    try:
+        local_answer = local_answers.answer(current_user, user_input) if new_question else None
+    except Exception as e:
+        local_answer = None
+        st.error(f"⚠️ Error reading meal data: {e}")
+
+    if local_answer is not None:
+        st.session_state.chat_history[current_user].append(("You", user_input))
+        st.session_state.chat_history[current_user].append(("Coach", local_answer))
+
+    elif new_question:
+        try:
+            user_context = get_base_context(current_user)
+            memory_context = get_memory_context(current_user, query=user_input)
+            symptom_insight = get_meal_symptom_insight(current_user)
+            sections, usage = fit_sections([
+                Section("user_context", user_context, priority=0, budget=300),
+                Section("memory_context", memory_context, priority=1, budget=500),
+                Section("symptom_insight", symptom_insight, priority=2, budget=300),
+            ], ceiling=PROMPT_TOKEN_CEILING - count_tokens(COACH_PROMPT.format(user_context="", memory_context="", symptom_insight="")))
+            full_context = COACH_PROMPT.format(**sections)
+
+            # Recent turns verbatim plus a rolling summary of older ones, so follow-ups keep their context
+            memory = st.session_state.conversation_memory.setdefault(current_user, ConversationMemory())
+            conversation = memory.messages(st.session_state.chat_history[current_user])
+            conversation_tokens = sum(count_tokens(m["content"]) for m in conversation)
+            usage["conversation"] = {"tokens": conversation_tokens, "turns": len(conversation)}
+
+            prompt_tokens = count_tokens(full_context) + conversation_tokens
+            st.session_state.last_prompt_usage = {"prompt_tokens": prompt_tokens, "sections": usage}
+            record_usage(current_user, usage, prompt_tokens)
+
+            messages = [{"role": "system", "content": full_context}, *conversation, {"role": "user", "content": user_input}]
+
+            # The conversation is part of the key: the same follow-up can mean something else elsewhere
+            key = cache_key(DEFAULT_MODEL, json.dumps([full_context, conversation], ensure_ascii=False), user_input)
+            with span("coach", prompt_tokens=prompt_tokens) as coach_span:
+                answer = None if st.session_state.get("bypass_reply_cache", False) else get_cache().get(key)
+                coach_span.set(cache_hit=answer is not None)
 
-    # Dynamically append messages
-    for speaker, msg in st.session_state.chat_history[current_user]:
-        if speaker == "You":
-            chat_html += f"""<div class="user-msg"><strong>{speaker}:</strong><br>{html.escape(msg)}</div>"""
-        else:
-            chat_html += f"""<div class="bot-msg"><strong>{speaker}:</strong><br>{html.escape(msg)}</div>"""
+            st.session_state.chat_history[current_user].append(("You", user_input))
+            if answer is not None:
+                st.session_state.chat_history[current_user].append(("Coach", answer))
+            else:
+                # A new question replaces a reply still being written
+                if current_user in st.session_state.pending_replies:
+                    llm_worker.cancel(st.session_state.session_id, st.session_state.pending_replies.pop(current_user))
+                # The worker calls OpenAI; this rerun carries on and the reply is picked up by a later one
+                llm_worker.submit(
+                    st.session_state.session_id, key, messages, stream=st.session_state.get("stream_replies", True),
+                    on_done=lambda reply, key=key, user=current_user: get_cache().put(key, reply, user),
+                )
+                st.session_state.pending_replies[current_user] = key
 
-    chat_html += "</div>"
+        except Exception as e:
+            st.error(f"⚠️ Error: {e}")
 
-    # Render the HTML using components.html
-    st.components.v1.html(chat_html, height=500)
+    pick_up_reply(current_user)
+    if current_user in st.session_state.pending_replies:
+        show_pending_reply(current_user)
 
+# --- Styled chat display ---
+if current_user and current_user in st.session_state.chat_history:
+    with span("render.transcript", messages=len(st.session_state.chat_history[current_user])):
+        render_transcript(current_user, st.session_state.chat_history[current_user])
+
+
+# --- Reply cache counters ---
+cache_stats = get_cache().stats()
+st.sidebar.caption(f"💾 Reply cache: {cache_stats['hits']} hits · {cache_stats['misses']} misses · {cache_stats['entries']} saved")
+local_stats = local_answers.stats()
+if local_stats["hits"] or local_stats["misses"]:
+    st.sidebar.caption(f"🧭 Answered locally: {local_stats['hits']} of {local_stats['hits'] + local_stats['misses']} questions ({local_stats['hit_rate']:.0%})")
+if "last_prompt_usage" in st.session_state:
+    last_usage = st.session_state.last_prompt_usage
+    per_section = " · ".join(f"{name} {info['tokens']}" for name, info in last_usage["sections"].items())
+    st.sidebar.caption(f"🧮 Last prompt: {last_usage['prompt_tokens']} tokens ({per_section})")
+
+# The first page is out; load what the first question needs while the user types it
+warm_up()
+end_rerun(user=current_user)
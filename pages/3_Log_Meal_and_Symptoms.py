@@ -1,11 +1,13 @@
 import streamlit as st
-from datetime import datetime, date
-import os
+from datetime import datetime, date, timedelta
 import pandas as pd
-
-MEAL_LOG_FILE = "meal_log.csv"
+from storage import append_meal, meal_log, open_log
+from insight_store import record_row
+from symptom_insights import SYMPTOMS
+from tracing import end_rerun, span, start_rerun
 
 st.set_page_config(page_title="Log Meal & Symptoms", layout="centered")
+start_rerun("log_meal")
 
 # --- Simplified Styling ---
 st.markdown("""
@@ -41,6 +43,9 @@ html, body, .stApp {
 
 st.title("🍽️ Log Meal & Symptoms")
 
+# Create the meal log or repair its columns (only does work once per process)
+open_log()
+
 # --- Select User ---
 if "users" not in st.session_state or not st.session_state.users:
     st.info("Please add a user from the Home page to continue.")
@@ -58,7 +63,7 @@ with st.form("meal_and_symptoms_form", clear_on_submit=True):
     meal_type = st.selectbox("Meal Type", ["Breakfast", "Lunch", "Dinner", "Snack"], key="meal_type")
     symptoms = st.multiselect(
         "What symptoms are you experiencing (if any)?",
-        ["Bloating", "Fatigue", "Headache", "Gas", "Skin rash", "Brain fog", "Acidity", "Other"]
+        SYMPTOMS + ["Other"]
     )
     notes = st.text_area("Additional notes (optional)")
     meal_date = st.date_input("Date of the Meal", max_value=date.today())
@@ -75,24 +80,18 @@ with st.form("meal_and_symptoms_form", clear_on_submit=True):
             "notes": notes.strip() if notes else ""  # Default to an empty string
         }
 
-        df = pd.DataFrame([log_entry])
-
-        # Ensure file integrity by validating and fixing column mismatches
-        if os.path.exists(MEAL_LOG_FILE):
-            try:
-                existing_df = pd.read_csv(MEAL_LOG_FILE)
-                # Ensure columns match before appending
-                expected_columns = ["timestamp", "date", "name", "meal", "meal_type", "symptoms", "notes"]
-                for col in expected_columns:
-                    if col not in existing_df.columns:
-                        existing_df[col] = ""  # Add missing columns with empty values
-                existing_df = pd.concat([existing_df, df], ignore_index=True)
-                existing_df.to_csv(MEAL_LOG_FILE, index=False)
-            except pd.errors.ParserError:
-                st.error("Meal log file structure is corrupted. Attempting to fix...")
-                df.to_csv(MEAL_LOG_FILE, mode='w', header=True, index=False)  # Overwrite with correct structure
-        else:
-            df.to_csv(MEAL_LOG_FILE, mode='w', header=True, index=False)
+        try:
+            with span("meal.append"):
+                append_meal(log_entry)
+        except OSError as e:
+            st.error(f"Could not save to the meal log: {e}")
+            st.stop()
+
+        try:
+            record_row(log_entry)
+        except (OSError, ValueError) as e:
+            # The meal is saved; the counters can be repaired with `python insight_store.py rebuild`
+            st.warning(f"Meal saved, but symptom insights could not be updated: {e}")
 
         st.success(f"Meal and symptoms logged successfully for {current_user} on {meal_date} ✅")
 
@@ -100,10 +99,16 @@ with st.form("meal_and_symptoms_form", clear_on_submit=True):
 st.markdown("---")
 st.subheader(f"🧠 Meals & Symptoms Timeline for {current_user}")
 
-if os.path.exists(MEAL_LOG_FILE):
+# Only the months in range are read when the log is partitioned
+TIMELINE_RANGES = {"Last 3 months": 90, "Last 12 months": 365, "Everything": None}
+timeline_range = st.selectbox("Show", list(TIMELINE_RANGES), index=0)
+range_days = TIMELINE_RANGES[timeline_range]
+since = str(date.today() - timedelta(days=range_days)) if range_days else None
+
+if not meal_log().empty:
     try:
-        meal_df = pd.read_csv(MEAL_LOG_FILE)
-        meal_df = meal_df[meal_df["name"] == current_user].sort_values("date", ascending=False)
+        with span("meals.timeline", since=since):
+            meal_df = meal_log().for_user(current_user, since=since).iloc[::-1]
         columns_to_display = ["date", "meal_type", "meal"]  # Default columns
 
         # Dynamically include optional columns if they exist
@@ -114,7 +119,11 @@ if os.path.exists(MEAL_LOG_FILE):
 
         if not meal_df.empty:
             st.dataframe(meal_df[columns_to_display])
+        elif since:
+            st.info(f"No meals and symptoms logged since {since}. Choose \"Everything\" to see older entries.")
         else:
             st.info("No meals and symptoms logged yet.")
     except pd.errors.ParserError:
         st.error("Error reading the meal log file. The file may be corrupted.")
+
+end_rerun(user=current_user)
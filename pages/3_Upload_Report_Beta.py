@@ -1,9 +1,12 @@
 
 import streamlit as st
 from datetime import date
-import os
-
-REPORT_FILE = "report_memory.txt"
+import hashlib
+import time
+import pdf_extract
+from storage import report_store
+from report_index import get_index
+from tracing import end_rerun, span, start_rerun
 
 # --- Upload style ---
 def apply_upload_style():
@@ -56,34 +59,80 @@ def apply_upload_style():
     """, unsafe_allow_html=True)
 
 # --- PDF Extraction ---
-def extract_text_from_pdf(file):
+def extract_text_from_pdf(data, source_hash):
+    """Text of an uploaded PDF, or None after showing the error.
+
+    Pages are read by worker processes while a progress bar updates; if the
+    page reruns meanwhile, the same extraction is picked up again.
+    """
+    # The same file uploaded before (for anyone) is not read again
+    known = store.find_by_hash(source_hash)
+    if known is not None:
+        return store.report_text(known["report_id"])
+
+    try:
+        job = pdf_extract.start(data, source_hash)
+    except Exception as e:
+        st.error(f"Error reading PDF: {e}")
+        return None
+    if job.truncated:
+        st.warning(f"Only the first {job.page_count} of {job.total_pages} pages are read.")
+
+    progress = st.progress(0.0, text="Reading report…")
+    while not job.done():
+        progress.progress(job.pages_done() / job.page_count, text=f"Reading page {job.pages_done()} of {job.page_count}…")
+        time.sleep(0.2)
+    progress.empty()
+
     try:
-        import PyPDF2
-        reader = PyPDF2.PdfReader(file)
-        return "\n".join([page.extract_text() for page in reader.pages if page.extract_text()])
+        return job.text()
     except Exception as e:
-        return f"Error reading PDF: {e}"
+        st.error(f"Error reading PDF: {e}")
+        return None
+    finally:
+        pdf_extract.finish(source_hash)
 
 # --- Page UI ---
 st.set_page_config(page_title="📁 Upload Medical Reports (Beta)", layout="centered")
+start_rerun("upload_report")
 st.title("📁 Upload Medical Reports (Beta)")
 apply_upload_style()
 
+users = st.session_state.get("users", [])
+report_user = st.selectbox("Whose report is this?", users) if users else ""
+
 uploaded_file = st.file_uploader("Upload a PDF or TXT report", type=["pdf", "txt"])
 
+store = report_store()
+
 if uploaded_file:
-    if uploaded_file.type == "text/plain":
-        new_text = uploaded_file.read().decode("utf-8")
-    else:
-        new_text = extract_text_from_pdf(uploaded_file)
+    data = uploaded_file.getvalue()
+    source_hash = hashlib.sha256(data).hexdigest()
 
-    with open(REPORT_FILE, "a") as f:
-        f.write("\n\n" + new_text.strip())
+    # The uploader keeps the file across reruns, so only store each file once
+    if store.find_report(report_user, source_hash) is None:
+        if uploaded_file.type == "text/plain":
+            new_text = data.decode("utf-8")
+        else:
+            with span("report.extract", size=len(data)):
+                new_text = extract_text_from_pdf(data, source_hash)
 
-    st.success("✅ Report uploaded and remembered")
-    st.rerun()
+        if new_text is not None:
+            with span("report.store"):
+                store.add_report(report_user, new_text.strip(), source_hash=source_hash, filename=uploaded_file.name)
+                get_index().sync(save=True)
+            st.success("✅ Report uploaded and remembered")
+    else:
+        st.info("This report is already remembered.")
 
-if os.path.exists(REPORT_FILE):
+reports = store.user_reports(report_user)
+if reports:
     with st.expander("🧠 View remembered report data"):
-        with open(REPORT_FILE, "r") as f:
-            st.text_area("Stored Report Info", value=f.read(), height=200)
+        selected = st.selectbox(
+            "Report",
+            reports,
+            format_func=lambda meta: f"{meta['upload_date']} – {meta['filename'] or 'report'} ({meta['chunk_count']} chunks)",
+        )
+        st.text_area("Stored Report Info", value=store.report_text(selected["report_id"]), height=200)
+
+end_rerun(user=report_user)
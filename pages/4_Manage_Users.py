@@ -1,25 +1,12 @@
 import streamlit as st
-import os
-import pandas as pd
-import json
 from datetime import date
-
-USER_FILE = "user_profiles.json"
-MEAL_LOG_FILE = "meal_log.csv"
-
-# Load and Save Functions
-def load_user_profiles():
-    if os.path.exists(USER_FILE):
-        with open(USER_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_user_profiles(profiles):
-    with open(USER_FILE, "w") as f:
-        json.dump(profiles, f)
+from storage import load_user_profiles, save_user_profile
+from user_deletion import delete_user
+from tracing import end_rerun, span, start_rerun
 
 # Set Page Config
 st.set_page_config(page_title="Manage Users", layout="centered")
+start_rerun("manage_users")
 
 # Inject CSS for dark + green UI and refined dropdown styling
 st.markdown("""
@@ -137,7 +124,7 @@ with col1:
             )
             st.session_state.users.append(new_user)
             st.session_state.user_profiles[new_user] = profile_text
-            save_user_profiles(st.session_state.user_profiles)
+            save_user_profile(new_user, profile_text)
             st.success(f"✅ {new_user} added!")
 
 # Delete User
@@ -148,9 +135,9 @@ with col2:
             st.session_state.users.remove(user_to_delete)
             st.session_state.chat_history.pop(user_to_delete, None)
             st.session_state.user_profiles.pop(user_to_delete, None)
-            save_user_profiles(st.session_state.user_profiles)
-            if os.path.exists(MEAL_LOG_FILE):
-                df = pd.read_csv(MEAL_LOG_FILE)
-                df = df[df["name"] != user_to_delete]
-                df.to_csv(MEAL_LOG_FILE, index=False)
+            st.session_state.get("conversation_memory", {}).pop(user_to_delete, None)
+            with span("user.delete"):
+                delete_user(user_to_delete)
             st.success(f"🗑️ {user_to_delete} deleted!")
+
+end_rerun()
@@ -0,0 +1,426 @@
+# parquet_log.py
+"""Meal and symptom history as typed Parquet snapshots per month, plus a small append log.
+
+    meal_snapshot/manifest.json                 {"version": 4, "tail": 9, "sealed": [], "partitions": {"2025-03": "2025-03.v4.1a2b3c4d.parquet"}, "users": {user: rows}}
+    meal_snapshot/2025-03.v4.1a2b3c4d.parquet   one month, sorted by user and date; dates and timestamps typed
+    meal_snapshot/log.9.csv                     rows logged since the last compaction
+
+New rows are appended to the current log, a plain CSV like the other
+backends write. Once it passes COMPACT_BYTES a background compaction seals
+it (new rows go to the next log) and merges it into the months it touches:
+each is rewritten as a new file, and the manifest switches to the new files
+in one rename. Readers take the snapshot files and the logs listed in one
+manifest, so every row is seen exactly once; they open only the months a
+query needs and let the Parquet reader skip row groups of other users.
+Snapshot files never change once written, so what was read from one is
+cached per user.
+
+Timestamps and dates the app cannot parse either (see symptom_insights) are
+stored empty. Needs pyarrow (pip install pyarrow). Used when
+GLUTENY_STORAGE=parquet.
+
+Usage:
+    python parquet_log.py convert    # build snapshots from meal_log.csv and symptom_log.csv
+    python parquet_log.py compact    # merge the append logs into the snapshots now
+"""
+import csv
+import importlib.util
+import os
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+
+import tombstones
+from log_cache import SYMPTOM_LOG_FILE, SYMPTOM_COLUMNS, invalidate, load_log
+from meal_store import MEAL_LOG_FILE, MEAL_COLUMNS, atomic_write_json, load_cached, locked
+from partitioned_log import UNDATED, month_of
+from tracing import span
+
+MEAL_SNAPSHOT_DIR = "meal_snapshot"
+SYMPTOM_SNAPSHOT_DIR = "symptom_snapshot"
+MANIFEST_FILE = "manifest.json"
+# Size of the append log that starts a background compaction
+COMPACT_BYTES = int(os.getenv("GLUTENY_SNAPSHOT_COMPACT_BYTES", 256 * 1024))
+# Rows per Parquet row group; a user's rows for a month usually fall in one
+ROW_GROUP_ROWS = 8192
+DATE_FORMAT = "%Y-%m-%d"
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+# manifest path -> ((mtime_ns, size), manifest)
+_manifests = {}
+# One worker, so compactions in this process never overlap
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gluteny-snapshot")
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def available():
+    """Whether pyarrow is installed."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+# --- Typed columns ---
+def _schema(columns):
+    import pyarrow as pa
+
+    # Parquet has no seconds unit, so timestamps are kept in milliseconds
+    types = {"date": pa.date32(), "timestamp": pa.timestamp("ms")}
+    return pa.schema([(col, types.get(col, pa.string())) for col in columns])
+
+
+def _typed(df, columns):
+    """Arrow table of a frame of strings, with date and timestamp parsed."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    arrays = []
+    for col in columns:
+        values = pa.array(df[col].tolist() if col in df.columns else [""] * len(df), type=pa.string())
+        if col == "date":
+            values = pc.strptime(values, format=DATE_FORMAT, unit="s", error_is_null=True).cast(pa.date32())
+        elif col == "timestamp":
+            values = pc.strptime(values, format=TIMESTAMP_FORMAT, unit="ms", error_is_null=True)
+        arrays.append(values)
+    return pa.table(arrays, schema=_schema(columns))
+
+
+def _conform(table, columns):
+    """`table` with exactly `columns` and their types; snapshots written before a column existed get it empty."""
+    if table.schema.names == list(columns):
+        return table.cast(_schema(columns))
+    return _typed(_text_frame(table, columns), columns)
+
+
+def _text_frame(table, columns):
+    """Frame of strings, as the CSV logs give, from a snapshot table."""
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    data = {}
+    for col in columns:
+        if col not in table.column_names:
+            data[col] = [""] * table.num_rows
+            continue
+        values = table[col]
+        if col == "date":
+            values = pc.strftime(values, format=DATE_FORMAT)
+        elif col == "timestamp":
+            # In seconds, or %S would print the milliseconds too
+            values = pc.strftime(values.cast(pa.timestamp("s")), format=TIMESTAMP_FORMAT)
+        data[col] = values.fill_null("").to_pandas()
+    return pd.DataFrame(data, columns=columns).astype(str)
+
+
+@lru_cache(maxsize=1024)
+def _user_rows(path, user, columns):
+    # Snapshot files are never modified, so their rows can be cached by path
+    import pyarrow.parquet as pq
+
+    with span("snapshot.read", path=path) as s:
+        table = pq.read_table(path, filters=[("name", "==", user)])
+        s.set(rows=table.num_rows)
+    return _text_frame(table, list(columns))
+
+
+def _sorted(frames):
+    import pandas as pd
+
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return None
+    if len(frames) == 1:
+        return frames[0]
+    # Rows still in the log can be dated before the snapshot's, e.g. a meal logged for last week
+    return pd.concat(frames, ignore_index=True).sort_values("date", kind="mergesort").reset_index(drop=True)
+
+
+class SnapshotLog:
+    """Same read interface as log_cache.IndexedLog over month snapshots plus the append logs."""
+
+    def __init__(self, directory, columns):
+        self.directory = directory
+        self.columns = list(columns)
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+
+    # --- Manifest ---
+    def manifest(self):
+        try:
+            return load_cached(self.manifest_path, _manifests)
+        except FileNotFoundError:
+            return {"version": 0, "tail": 0, "sealed": [], "partitions": {}, "users": {}}
+
+    def _save_manifest(self, manifest):
+        atomic_write_json(self.manifest_path, manifest)
+
+    def _log_path(self, generation):
+        return os.path.join(self.directory, f"log.{generation}.csv")
+
+    def _logs(self, manifest):
+        logs = []
+        for generation in manifest["sealed"]:
+            path = self._log_path(generation)
+            if not os.path.exists(path):
+                # A compaction merged it and removed it since `manifest` was read
+                raise FileNotFoundError(path)
+            logs.append(load_log(path, self.columns))
+        logs.append(load_log(self._log_path(manifest["tail"]), self.columns))
+        return logs
+
+    def _months(self, manifest, since=None):
+        months = sorted(manifest["partitions"], key=lambda m: "" if m == UNDATED else m)
+        if since:
+            months = [month for month in months if month != UNDATED and month >= since[:7]]
+        return months
+
+    def _snapshot(self, manifest, user, months):
+        columns = tuple(self.columns)
+        return [_user_rows(os.path.join(self.directory, manifest["partitions"][month]), user, columns) for month in months]
+
+    def _read(self, query):
+        """query(manifest), retried once if a compaction removed the files it named meanwhile."""
+        try:
+            return query(self.manifest())
+        except FileNotFoundError:
+            _manifests.pop(self.manifest_path, None)
+            return query(self.manifest())
+
+    def _empty_frame(self):
+        import pandas as pd
+
+        return pd.DataFrame(columns=self.columns, dtype=str)
+
+    # --- Reading ---
+    @property
+    def empty(self):
+        return not self.users()
+
+    def users(self):
+        def query(manifest):
+            users = dict.fromkeys(manifest["users"])
+            for log in self._logs(manifest):
+                users.update(dict.fromkeys(log.users()))
+            return list(users)
+        return self._read(query)
+
+    def for_user(self, user, since=None):
+        """All rows for `user`, oldest date first; `since` skips whole months before it."""
+        def query(manifest):
+            frames = self._snapshot(manifest, user, self._months(manifest, since))
+            frames += [log.for_user(user, since) for log in self._logs(manifest)]
+            frame = _sorted(frames)
+            if frame is None:
+                return self._empty_frame()
+            return frame[frame["date"] >= since] if since else frame
+        return self._read(query)
+
+    def on_date(self, user, date_str):
+        def query(manifest):
+            month = month_of(date_str)
+            frames = [log.on_date(user, date_str) for log in self._logs(manifest)]
+            if month in manifest["partitions"]:
+                frame = self._snapshot(manifest, user, [month])[0]
+                frames.insert(0, frame[frame["date"] == date_str])
+            frame = _sorted(frames)
+            return self._empty_frame() if frame is None else frame
+        return self._read(query)
+
+    def recent(self, user, n):
+        """`user`'s last `n` rows, oldest first, reading the newest months only."""
+        def query(manifest):
+            frames = [log.for_user(user) for log in self._logs(manifest)]
+            rows = 0
+            for month in reversed(self._months(manifest)):
+                frame = self._snapshot(manifest, user, [month])[0]
+                frames.insert(0, frame)
+                rows += len(frame)
+                if rows >= n:
+                    break
+            frame = _sorted(frames)
+            return self._empty_frame() if frame is None else frame.tail(n)
+        return self._read(query)
+
+    # --- Writing ---
+    def append(self, entry):
+        os.makedirs(self.directory, exist_ok=True)
+        # Under the manifest lock, so a compaction never seals the log between choosing it and writing to it
+        with locked(self.manifest_path):
+            path = self._log_path(self.manifest()["tail"])
+            new = not os.path.exists(path)
+            with open(path, "a", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=self.columns, restval="", extrasaction="ignore", lineterminator="\n")
+                if new:
+                    writer.writeheader()
+                writer.writerow(entry)
+            size = os.path.getsize(path)
+        if size >= COMPACT_BYTES:
+            self.schedule_compaction()
+
+    def schedule_compaction(self, deleted=None):
+        """Run compact() on the background worker; returns its future."""
+        with _pending_lock:
+            pending = _pending.get(self.directory)
+            if deleted is None and pending is not None and not pending.done():
+                return pending
+            _pending[self.directory] = _executor.submit(self.compact, deleted)
+            return _pending[self.directory]
+
+    def compact(self, deleted=None):
+        """Merge the append logs into the snapshots, dropping rows hidden by the {user: deleted_at} tombstones.
+
+        Returns how many rows were dropped.
+        """
+        import pandas as pd
+
+        os.makedirs(self.directory, exist_ok=True)
+        with locked(self.manifest_path):
+            base = dict(self.manifest())
+            if os.path.exists(self._log_path(base["tail"])):
+                base["sealed"] = base["sealed"] + [base["tail"]]
+                base["tail"] += 1
+                self._save_manifest(base)
+        generations = list(base["sealed"])
+        if not generations and not deleted:
+            return 0
+
+        with span("snapshot.compact", directory=self.directory, logs=len(generations)):
+            frames = [pd.read_csv(self._log_path(g), dtype=str, keep_default_na=False) for g in generations]
+            new_rows = pd.concat(frames, ignore_index=True) if frames else self._empty_frame()
+            new_rows = new_rows[new_rows["name"] != ""] if "name" in new_rows.columns else new_rows
+            partitions, users, dropped, written = self._merge(base, new_rows, deleted or {})
+
+        with locked(self.manifest_path):
+            current = dict(self.manifest())
+            if current["version"] != base["version"]:
+                # Another process compacted first; its snapshots include these logs or leave them sealed
+                for name in written:
+                    os.remove(os.path.join(self.directory, name))
+                return 0
+            current.update(
+                version=base["version"] + 1, partitions=partitions, users=users,
+                sealed=[g for g in current["sealed"] if g not in generations],
+            )
+            self._save_manifest(current)
+
+        replaced = set(base["partitions"].values()) - set(partitions.values())
+        for name in replaced:
+            os.remove(os.path.join(self.directory, name))
+        for generation in generations:
+            os.remove(self._log_path(generation))
+            invalidate(self._log_path(generation))
+        return dropped
+
+    def _merge(self, base, new_rows, deleted):
+        """(partitions, users, dropped, files written) after adding `new_rows` and dropping deleted users' rows."""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        version = base["version"] + 1
+        partitions, users = dict(base["partitions"]), dict(base["users"])
+        by_month = {}
+        if not new_rows.empty:
+            for month, rows in new_rows.groupby(new_rows["date"].map(month_of), sort=False):
+                by_month[month] = _typed(rows, self.columns)
+        months = set(by_month)
+        if deleted:
+            names = list(deleted)
+            for month, name in base["partitions"].items():
+                path = os.path.join(self.directory, name)
+                if pq.read_table(path, columns=["name"], filters=[("name", "in", names)]).num_rows:
+                    months.add(month)
+
+        dropped, written = 0, []
+        for month in sorted(months):
+            tables = [by_month[month]] if month in by_month else []
+            if month in base["partitions"]:
+                old = pq.read_table(os.path.join(self.directory, base["partitions"][month]))
+                tables.insert(0, _conform(old, self.columns))
+            table = pa.concat_tables(tables)
+            if deleted:
+                keep = self._keep_mask(table, deleted)
+                removed = table.filter(pc.invert(keep))
+                for item in pc.value_counts(removed["name"]).to_pylist():
+                    users[item["values"]] = users.get(item["values"], 0) - item["counts"]
+                dropped += removed.num_rows
+                table = table.filter(keep)
+            if month in by_month:
+                for item in pc.value_counts(by_month[month]["name"]).to_pylist():
+                    users[item["values"]] = users.get(item["values"], 0) + item["counts"]
+            if table.num_rows == 0:
+                partitions.pop(month, None)
+                continue
+            # Stable sort: rows of one user and day keep the order they were logged in
+            table = table.take(pc.sort_indices(table, sort_keys=[("name", "ascending"), ("date", "ascending")]))
+            # Unique, so a compaction racing in another process never overwrites this one's files
+            name = f"{month}.v{version}.{uuid.uuid4().hex[:8]}.parquet"
+            pq.write_table(table, os.path.join(self.directory, name), row_group_size=ROW_GROUP_ROWS)
+            partitions[month] = name
+            written.append(name)
+        users = {user: rows for user, rows in users.items() if rows > 0}
+        return partitions, users, dropped, written
+
+    def _keep_mask(self, table, deleted):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        drop = pa.array([False] * table.num_rows)
+        stamps = table["timestamp"].cast(pa.timestamp("us"))
+        for user, deleted_at in deleted.items():
+            cutoff = pa.scalar(datetime.fromisoformat(deleted_at), type=pa.timestamp("us"))
+            # Rows without a timestamp cannot be placed after the deletion, so they go too
+            hidden = pc.or_kleene(pc.less_equal(stamps, cutoff), pc.is_null(stamps))
+            drop = pc.or_(drop, pc.and_(pc.equal(table["name"], user), hidden))
+        return pc.invert(drop)
+
+
+def meal_snapshots():
+    return SnapshotLog(MEAL_SNAPSHOT_DIR, MEAL_COLUMNS)
+
+
+def symptom_snapshots():
+    return SnapshotLog(SYMPTOM_SNAPSHOT_DIR, SYMPTOM_COLUMNS)
+
+
+# --- Conversion ---
+def convert_log(path, log):
+    """Build `log`'s snapshots from a single-file CSV log; returns a summary line."""
+    import pandas as pd
+
+    if not log.empty:
+        return f"{log.directory}: already has snapshots, skipped"
+    if not os.path.exists(path):
+        return f"{log.directory}: {path} not found, skipped"
+
+    rows = pd.read_csv(path, dtype=str, keep_default_na=False)
+    for col in log.columns:
+        if col not in rows.columns:
+            rows[col] = ""
+    # Rows of deleted users that were not compacted yet are left behind
+    hidden = [tombstones.hidden(name, stamp) for name, stamp in zip(rows["name"], rows["timestamp"])]
+    rows = rows[(rows["name"] != "") & ~pd.Series(hidden, index=rows.index, dtype=bool)]
+
+    os.makedirs(log.directory, exist_ok=True)
+    with locked(log.manifest_path):
+        base = dict(log.manifest())
+        partitions, users, _, _ = log._merge(base, rows, {})
+        base.update(version=base["version"] + 1, partitions=partitions, users=users)
+        log._save_manifest(base)
+    return f"{log.directory}: {len(rows)} rows in {len(partitions)} monthly snapshots for {len(users)} users"
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("convert", "compact"):
+        print(__doc__)
+        sys.exit(1)
+    if sys.argv[1] == "convert":
+        print(convert_log(MEAL_LOG_FILE, meal_snapshots()))
+        print(convert_log(SYMPTOM_LOG_FILE, symptom_snapshots()))
+        print("Done. Set GLUTENY_STORAGE=parquet to use them.")
+    else:
+        for log in (meal_snapshots(), symptom_snapshots()):
+            log.compact()
+            print(f"{log.directory}: {len(log.manifest()['partitions'])} monthly snapshots, append log merged")
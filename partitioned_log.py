@@ -0,0 +1,186 @@
+# partitioned_log.py
+"""Meal and symptom logs split into one CSV per user per month.
+
+    meal_logs/manifest.json             {user: {"months": {"2025-03": rows}}}
+    meal_logs/<user>/2025-03.csv
+
+Reads for one user only open that user's partitions, and date or "recent"
+queries only the months they need. Used when GLUTENY_STORAGE=partitioned.
+
+Usage:
+    python partitioned_log.py convert    # split meal_log.csv and symptom_log.csv into partitions
+"""
+import csv
+import os
+import shutil
+import sys
+from urllib.parse import quote
+
+import tombstones
+from log_cache import SYMPTOM_LOG_FILE, SYMPTOM_COLUMNS, load_log
+from meal_store import MEAL_LOG_FILE, MEAL_COLUMNS, append_row, atomic_write_json, load_cached, locked
+from tracing import span
+
+MEAL_PARTITION_DIR = "meal_logs"
+SYMPTOM_PARTITION_DIR = "symptom_logs"
+MANIFEST_FILE = "manifest.json"
+UNDATED = "undated"
+
+# manifest path -> ((mtime_ns, size), manifest)
+_manifests = {}
+
+
+def month_of(date_str):
+    month = (date_str or "")[:7]
+    return month if len(month) == 7 and month[4] == "-" else UNDATED
+
+
+class PartitionedLog:
+    """Same read interface as log_cache.IndexedLog over per-user monthly partitions."""
+
+    def __init__(self, directory, columns):
+        self.directory = directory
+        self.columns = list(columns)
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+
+    # --- Manifest ---
+    def manifest(self):
+        try:
+            return load_cached(self.manifest_path, _manifests)
+        except FileNotFoundError:
+            return {}
+
+    def _save_manifest(self, manifest):
+        atomic_write_json(self.manifest_path, manifest)
+
+    def _user_dir(self, user):
+        # Dots are escaped too, so names like ".." cannot point outside the log directory
+        return os.path.join(self.directory, quote(user, safe="").replace(".", "%2E"))
+
+    def _partition(self, user, month):
+        return os.path.join(self._user_dir(user), month + ".csv")
+
+    def months(self, user):
+        """`user`'s months, oldest first (undated rows sort before every month)."""
+        info = self.manifest().get(user)
+        if not info:
+            return []
+        return sorted(info["months"], key=lambda m: "" if m == UNDATED else m)
+
+    def _frame(self, user, months):
+        import pandas as pd
+
+        with span("log.read_partitions", months=len(months)):
+            frames = [load_log(self._partition(user, month), self.columns).df for month in months]
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=self.columns, dtype=str)
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    # --- Reading ---
+    @property
+    def empty(self):
+        return not self.manifest()
+
+    def users(self):
+        return list(self.manifest())
+
+    def for_user(self, user, since=None):
+        """All rows for `user`, oldest date first; `since` skips whole months before it."""
+        months = self.months(user)
+        if since:
+            months = [month for month in months if month != UNDATED and month >= since[:7]]
+        frame = self._frame(user, months)
+        return frame[frame["date"] >= since] if since else frame
+
+    def on_date(self, user, date_str):
+        info = self.manifest().get(user)
+        month = month_of(date_str)
+        if not info or month not in info["months"]:
+            return self._frame(user, [])
+        return load_log(self._partition(user, month), self.columns).on_date(user, date_str)
+
+    def recent(self, user, n):
+        """`user`'s last `n` rows, oldest first, reading the newest months only."""
+        import pandas as pd
+
+        frames, rows = [], 0
+        for month in reversed(self.months(user)):
+            frame = self._frame(user, [month])
+            frames.insert(0, frame)
+            rows += len(frame)
+            if rows >= n:
+                break
+        if not frames:
+            return pd.DataFrame(columns=self.columns, dtype=str)
+        return pd.concat(frames, ignore_index=True).tail(n)
+
+    # --- Writing ---
+    def append(self, entry):
+        user = entry["name"]
+        month = month_of(entry.get("date"))
+        os.makedirs(self._user_dir(user), exist_ok=True)
+        # The row goes in first: a partition missing from the manifest is never read, never the reverse
+        append_row(entry, self._partition(user, month), self.columns)
+        with locked(self.manifest_path):
+            manifest = dict(self.manifest())
+            months = dict(manifest.get(user, {}).get("months", {}))
+            months[month] = months.get(month, 0) + 1
+            manifest[user] = {"months": months}
+            self._save_manifest(manifest)
+
+    def delete_user(self, user):
+        """Drop every partition of `user`; other users' files are not touched."""
+        os.makedirs(self.directory, exist_ok=True)
+        with locked(self.manifest_path):
+            manifest = dict(self.manifest())
+            if manifest.pop(user, None) is None:
+                return
+            self._save_manifest(manifest)
+            shutil.rmtree(self._user_dir(user), ignore_errors=True)
+
+
+def meal_partitions():
+    return PartitionedLog(MEAL_PARTITION_DIR, MEAL_COLUMNS)
+
+
+def symptom_partitions():
+    return PartitionedLog(SYMPTOM_PARTITION_DIR, SYMPTOM_COLUMNS)
+
+
+# --- Conversion ---
+def convert_log(path, log):
+    """Split a single-file CSV log into `log`'s partitions; returns a summary line."""
+    if not log.empty:
+        return f"{log.directory}: already partitioned, skipped"
+    if not os.path.exists(path):
+        return f"{log.directory}: {path} not found, skipped"
+
+    partitions = {}
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            # Rows of deleted users that were not compacted yet are left behind
+            if row.get("name") and not tombstones.hidden(row["name"], row.get("timestamp")):
+                partitions.setdefault((row["name"], month_of(row.get("date"))), []).append(row)
+
+    manifest = {}
+    for (user, month), rows in partitions.items():
+        info = manifest.setdefault(user, {"months": {}})
+        os.makedirs(log._user_dir(user), exist_ok=True)
+        with open(log._partition(user, month), "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=log.columns, restval="", extrasaction="ignore", lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(rows)
+        info["months"][month] = len(rows)
+    os.makedirs(log.directory, exist_ok=True)
+    log._save_manifest(manifest)
+    return f"{log.directory}: {sum(map(len, partitions.values()))} rows in {len(partitions)} partitions for {len(manifest)} users"
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "convert":
+        print(__doc__)
+        sys.exit(1)
+    print(convert_log(MEAL_LOG_FILE, meal_partitions()))
+    print(convert_log(SYMPTOM_LOG_FILE, symptom_partitions()))
+    print("Done. Set GLUTENY_STORAGE=partitioned to use them.")
@@ -0,0 +1,123 @@
+# pdf_extract.py
+"""Text extraction for uploaded PDF reports.
+
+Pages are extracted in batches by a pool of worker processes, so a long lab
+report neither blocks the Streamlit server nor waits on a single core. Only
+the first MAX_PAGES pages are read. Extractions are registered by the file's
+SHA-256, so a rerun of the upload page picks up the one already running
+instead of starting again.
+
+Usage:
+    python pdf_extract.py report.pdf
+"""
+import io
+import math
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+MAX_PAGES = int(os.getenv("GLUTENY_PDF_MAX_PAGES", 50))
+EXTRACT_WORKERS = int(os.getenv("GLUTENY_PDF_WORKERS", min(4, os.cpu_count() or 1)))
+# Smallest batch of pages per task; PDFs this short are read in-process, where a worker would only add start-up time
+PAGES_PER_TASK = 4
+# Batches per worker: enough for a smooth progress bar, few enough that re-opening the PDF per batch stays cheap
+BATCHES_PER_WORKER = 4
+
+_pool = None
+_pool_lock = threading.Lock()
+# sha256 -> Extraction, from start() until finish()
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def _reader(data):
+    import PyPDF2
+
+    return PyPDF2.PdfReader(io.BytesIO(data))
+
+
+def _extract_pages(data, start, stop):
+    """Text of pages [start, stop) of a PDF; runs in a worker process."""
+    reader = _reader(data)
+    return [reader.pages[page].extract_text() or "" for page in range(start, stop)]
+
+
+def get_pool():
+    """Process-wide extraction pool, started on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Workers are spawned: forking the multi-threaded Streamlit server is not safe
+                _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+class Extraction:
+    """One PDF being extracted, batch by batch."""
+
+    def __init__(self, data, max_pages=MAX_PAGES):
+        self.total_pages = len(_reader(data).pages)
+        self.page_count = min(self.total_pages, max_pages)
+        self._batches = []
+        if self.page_count <= PAGES_PER_TASK:
+            future = Future()
+            future.set_result(_extract_pages(data, 0, self.page_count))
+            self._batches.append((future, self.page_count))
+            return
+        pool = get_pool()
+        batch = max(PAGES_PER_TASK, math.ceil(self.page_count / (EXTRACT_WORKERS * BATCHES_PER_WORKER)))
+        for start in range(0, self.page_count, batch):
+            stop = min(start + batch, self.page_count)
+            self._batches.append((pool.submit(_extract_pages, data, start, stop), stop - start))
+
+    @property
+    def truncated(self):
+        return self.total_pages > self.page_count
+
+    def done(self):
+        return all(future.done() for future, _ in self._batches)
+
+    def pages_done(self):
+        return sum(size for future, size in self._batches if future.done())
+
+    def text(self, timeout=None):
+        """The extracted text, waiting for pages still in progress; raises what a worker raised."""
+        pages = [page for future, _ in self._batches for page in future.result(timeout)]
+        return "\n".join(page for page in pages if page)
+
+
+def start(data, source_hash):
+    """The running Extraction of `data`, starting one if there is none."""
+    with _jobs_lock:
+        job = _jobs.get(source_hash)
+        if job is None:
+            job = _jobs[source_hash] = Extraction(data)
+        return job
+
+
+def finish(source_hash):
+    """Forget the extraction of `source_hash` once its text was used."""
+    with _jobs_lock:
+        _jobs.pop(source_hash, None)
+
+
+def extract_text(file):
+    """Text of a PDF given as a path, bytes or file object, waiting for every page."""
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as f:
+            data = f.read()
+    elif isinstance(file, bytes):
+        data = file
+    else:
+        data = file.getvalue() if hasattr(file, "getvalue") else file.read()
+    return Extraction(data).text()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    print(extract_text(sys.argv[1]))
@@ -0,0 +1,135 @@
+# prompt_budget.py
+import json
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from llm_client import DEFAULT_MODEL
+from meal_store import atomic_file
+
+PROMPT_TOKEN_CEILING = int(os.getenv("GLUTENY_PROMPT_MAX_TOKENS", 1500))
+PROMPT_USAGE_FILE = "prompt_usage.jsonl"
+TRIM_MARKER = "… (trimmed)"
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+_usage_lock = threading.Lock()
+
+# priority: lower numbers are kept longest when the whole prompt is over the ceiling
+# keep: "head" keeps the first lines when trimming, "tail" the last ones
+Section = namedtuple("Section", ["name", "text", "priority", "budget", "keep"], defaults=["head"])
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text, model=DEFAULT_MODEL):
+    """Tokens in `text`, exact with tiktoken installed, otherwise a close word/punctuation estimate."""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # Roughly one token per word or symbol, and never fewer than one per four characters
+    return max(len(_WORD_RE.findall(text)), len(text) // 4)
+
+
+def truncate(text, max_tokens, keep="head", model=DEFAULT_MODEL):
+    """Cut `text` to at most `max_tokens`, on line boundaries where possible."""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    room = max_tokens - count_tokens(TRIM_MARKER, model)
+    if room <= 0:
+        return ""
+
+    lines = text.splitlines()
+    if keep == "tail":
+        lines.reverse()
+    kept, used = [], 0
+    for line in lines:
+        cost = count_tokens(line, model) + 1
+        if used + cost > room:
+            break
+        kept.append(line)
+        used += cost
+
+    if not kept:
+        # A single line is longer than the whole budget: cut it by characters
+        line = lines[0]
+        while line and count_tokens(line, model) > room:
+            line = line[:len(line) * 3 // 4] if keep == "head" else line[len(line) // 4:]
+        kept = [line]
+
+    if keep == "tail":
+        kept.reverse()
+        return "\n".join([TRIM_MARKER] + kept)
+    return "\n".join(kept + [TRIM_MARKER])
+
+
+def fit_sections(sections, ceiling=PROMPT_TOKEN_CEILING, model=DEFAULT_MODEL):
+    """Trim each section to its budget, then trim the least important ones until the total fits.
+
+    Returns ({name: text}, {name: usage}) where usage records the original
+    and final token counts of every section.
+    """
+    texts, usage = {}, {}
+    for section in sections:
+        original = count_tokens(section.text, model)
+        texts[section.name] = truncate(section.text, section.budget, section.keep, model)
+        usage[section.name] = {"budget": section.budget, "original": original}
+
+    tokens = {name: count_tokens(text, model) for name, text in texts.items()}
+    total = sum(tokens.values())
+    for section in sorted(sections, key=lambda s: s.priority, reverse=True):
+        if total <= ceiling:
+            break
+        allowed = max(0, tokens[section.name] - (total - ceiling))
+        texts[section.name] = truncate(texts[section.name], allowed, section.keep, model)
+        total -= tokens[section.name]
+        tokens[section.name] = count_tokens(texts[section.name], model)
+        total += tokens[section.name]
+
+    for name, info in usage.items():
+        info["tokens"] = tokens[name]
+        info["trimmed"] = tokens[name] < info["original"]
+    return texts, usage
+
+
+def drop_usage(deleted, path=PROMPT_USAGE_FILE):
+    """Rewrite the usage log without entries of users deleted at or after their time."""
+    if not os.path.exists(path):
+        return 0
+    with _usage_lock:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        kept = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            deleted_at = deleted.get(entry.get("user"))
+            if deleted_at is None or entry.get("time", "") > deleted_at:
+                kept.append(line)
+        if len(kept) < len(lines):
+            with atomic_file(path, encoding="utf-8") as f:
+                f.writelines(kept)
+    return len(lines) - len(kept)
+
+
+def record_usage(user, usage, prompt_tokens, path=PROMPT_USAGE_FILE):
+    """Append one request's per-section token usage to a JSONL log."""
+    entry = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "user": user, "prompt_tokens": prompt_tokens, "sections": usage}
+    with _usage_lock, open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
@@ -0,0 +1,213 @@
+# report_index.py
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from meal_store import atomic_write_json
+from report_store import LEGACY_REPORT_FILE
+from storage import report_store
+from tail_reader import read_last_lines
+from tracing import traced
+
+INDEX_FILE = "bm25_index.json"
+SYNC_BATCH = 1000
+
+# BM25 tuning constants
+K1 = 1.5
+B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+_STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from has have how i in is it its me my "
+    "of on or so than that the this to was were what when which who why will with you your".split()
+)
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class ReportIndex:
+    """Incremental BM25 inverted index over the chunks in a ReportStore.
+
+    Chunks are append-only, so the index only ever has to add the chunks
+    written since it last synced. A JSON snapshot next to the store lets a
+    new process start from where the last one stopped.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.path = os.path.join(store.directory, INDEX_FILE)
+        self.postings = {}    # term -> {chunk_no: term frequency}
+        self.doc_len = {}     # chunk_no -> number of tokens
+        self.chunk_user = {}  # chunk_no -> user
+        self.total_len = 0
+        self.covered = 0      # chunks [0, covered) are indexed
+        self._lock = threading.Lock()
+        # Saves run one at a time so an older snapshot never replaces a newer one
+        self._save_lock = threading.Lock()
+        self._load()
+
+    # --- Persistence ---
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return  # A broken snapshot is rebuilt by the next sync
+        self.postings = {term: {int(c): tf for c, tf in pairs} for term, pairs in data["postings"].items()}
+        self.doc_len = {int(c): n for c, n in data["doc_len"].items()}
+        self.chunk_user = {int(c): u for c, u in data["chunk_user"].items()}
+        self.total_len = sum(self.doc_len.values())
+        self.covered = data["covered"]
+
+    def save(self):
+        with self._save_lock:
+            with self._lock:
+                data = {
+                    "covered": self.covered,
+                    "postings": {term: list(docs.items()) for term, docs in self.postings.items()},
+                    "doc_len": self.doc_len,
+                    "chunk_user": self.chunk_user,
+                }
+            atomic_write_json(self.path, data)
+
+    # --- Indexing ---
+    def sync(self, save=False):
+        """Index every chunk stored since the last sync; returns how many were added."""
+        reports = self.store.all_reports()
+        committed = reports[-1]["first_chunk"] + reports[-1]["chunk_count"] if reports else 0
+        if committed <= self.covered:
+            return 0
+
+        with self._lock:
+            start = self.covered
+            if committed <= start:
+                return 0
+            users = {meta["report_id"]: meta["user"] for meta in reports if meta["first_chunk"] + meta["chunk_count"] > start}
+            for batch_start in range(start, committed, SYNC_BATCH):
+                batch = self.store.chunks(batch_start, min(batch_start + SYNC_BATCH, committed))
+                for chunk_no, chunk in enumerate(batch, batch_start):
+                    counts = Counter(tokenize(chunk["text"]))
+                    for term, tf in counts.items():
+                        self.postings.setdefault(term, {})[chunk_no] = tf
+                    length = sum(counts.values())
+                    self.doc_len[chunk_no] = length
+                    self.chunk_user[chunk_no] = users.get(chunk["report_id"], "")
+                    self.total_len += length
+            self.covered = committed
+
+        if save:
+            self.save()
+        return committed - start
+
+    def forget(self, chunk_nos):
+        """Drop chunks from the index (their text was deleted); returns how many were indexed."""
+        with self._lock:
+            gone = {chunk_no for chunk_no in chunk_nos if chunk_no in self.doc_len}
+            if not gone:
+                return 0
+            for term in list(self.postings):
+                docs = self.postings[term]
+                for chunk_no in gone.intersection(docs):
+                    del docs[chunk_no]
+                if not docs:
+                    del self.postings[term]
+            for chunk_no in gone:
+                self.total_len -= self.doc_len.pop(chunk_no)
+                self.chunk_user.pop(chunk_no, None)
+        return len(gone)
+
+    # --- Querying ---
+    def search(self, query, user=None, k=3):
+        """Top-k (score, chunk_no) pairs for `query`, optionally limited to one user's reports."""
+        self.sync()
+        scores = {}
+        # sync() on upload and forget() on the compaction thread change these dicts in place
+        with self._lock:
+            n_docs = len(self.doc_len)
+            if not n_docs:
+                return []
+            avg_len = self.total_len / n_docs
+            for term in set(tokenize(query)):
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                for chunk_no, tf in docs.items():
+                    if user is not None and self.chunk_user.get(chunk_no) != user:
+                        continue
+                    norm = tf + K1 * (1 - B + B * self.doc_len[chunk_no] / avg_len)
+                    scores[chunk_no] = scores.get(chunk_no, 0.0) + idf * tf * (K1 + 1) / norm
+
+        return sorted(((score, chunk_no) for chunk_no, score in scores.items()), reverse=True)[:k]
+
+
+_indexes = {}
+
+
+def get_index(store=None):
+    """The shared index over `store`, by default the configured backend's report store."""
+    store = store or report_store()
+    index = _indexes.get(store.directory)
+    if index is None:
+        index = _indexes.setdefault(store.directory, ReportIndex(store))
+    return index
+
+
+def relevant_passages(user, query, k=3, max_lines=10):
+    """Report lines from `user`'s top-k chunks that mention a query term, grouped by report, newest first.
+
+    Each group opens with the report's upload date, so a value from an old
+    report is not read as the current one.
+    """
+    index = get_index()
+    terms = set(tokenize(query))
+    hits = []
+    for _, chunk_no in index.search(query, user=user, k=k):
+        chunk = index.store.get_chunk(chunk_no)
+        lines = [line for line in chunk["text"].splitlines() if terms.intersection(tokenize(line))]
+        if lines:
+            hits.append((chunk["report_id"], chunk_no, lines))
+
+    passages, remaining, current = [], max_lines, None
+    # Report ids grow with every upload, so the highest is the newest
+    for report_id, _, lines in sorted(hits, key=lambda hit: (-hit[0], hit[1])):
+        if remaining <= 0:
+            break
+        if report_id != current:
+            current = report_id
+            meta = index.store.get_report(report_id) or {}
+            uploaded = (meta.get("uploaded_at") or meta.get("upload_date") or "an unknown date").replace("T", " ")
+            passages.append(f"From the report uploaded {uploaded}:")
+        passages.extend(lines[:remaining])
+        remaining -= len(lines[:remaining])
+    return passages
+
+
+@traced("reports.context")
+def report_context(user, query=None, max_lines=10):
+    """Prompt block with the report passages that match `query`.
+
+    Without a query (or without a match) it falls back to the end of the
+    user's latest report, then to the legacy report_memory.txt.
+    """
+    if query:
+        lines = relevant_passages(user, query, max_lines=max_lines)
+        if lines:
+            return "\nRelevant Report Passages (newest report first):\n" + "\n".join(lines) + "\n"
+
+    store = report_store()
+    reports = store.user_reports(user)
+    if reports:
+        latest = reports[0]
+        lines = store.report_chunks(latest["report_id"], -1)[0].splitlines()[-max_lines:] if latest["chunk_count"] else []
+        return f"\nReport Summary (latest report, {latest['upload_date']}):\n" + "\n".join(lines) + "\n"
+    if os.path.exists(LEGACY_REPORT_FILE):
+        return f"\nReport Summary (latest {max_lines} lines):\n" + "".join(read_last_lines(LEGACY_REPORT_FILE, max_lines))
+    return ""
@@ -0,0 +1,221 @@
+# report_store.py
+import json
+import os
+import struct
+import textwrap
+import threading
+from datetime import datetime
+
+from meal_store import locked
+
+REPORT_STORE_DIR = "report_store"
+LEGACY_REPORT_FILE = "report_memory.txt"
+CHUNK_CHARS = 800
+
+# Each index entry is (byte offset, byte length) of one JSON line in the data file
+_ENTRY = struct.Struct("<QQ")
+
+
+def split_chunks(text, chunk_chars=CHUNK_CHARS):
+    """Split report text into chunks of whole lines, dropping blank lines."""
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if len(line) > chunk_chars:
+            lines.extend(textwrap.wrap(line, chunk_chars))
+        elif line:
+            lines.append(line)
+
+    chunks, current, size = [], [], 0
+    for line in lines:
+        if current and size + len(line) > chunk_chars:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+class ReportStore:
+    """Append-only store with one record per uploaded report.
+
+    reports.jsonl holds one metadata line per report and report_chunks.jsonl one
+    line per chunk of text. The matching .idx files hold fixed-size offset
+    entries, so report N and chunk N are each found with a single seek.
+    """
+
+    def __init__(self, directory=REPORT_STORE_DIR):
+        self.directory = directory
+        self.reports_path = os.path.join(directory, "reports.jsonl")
+        self.reports_idx = os.path.join(directory, "reports.idx")
+        self.chunks_path = os.path.join(directory, "report_chunks.jsonl")
+        self.chunks_idx = os.path.join(directory, "report_chunks.idx")
+        # Metadata of every report, read incrementally as the index grows
+        self._meta = []
+        self._lock = threading.Lock()
+
+    # --- Index helpers ---
+    @staticmethod
+    def _count(idx_path):
+        try:
+            return os.path.getsize(idx_path) // _ENTRY.size
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _append(data_path, idx_path, records):
+        with open(data_path, "ab") as data, open(idx_path, "ab") as idx:
+            offset = data.seek(0, os.SEEK_END)
+            for record in records:
+                line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+                data.write(line)
+                idx.write(_ENTRY.pack(offset, len(line)))
+                offset += len(line)
+
+    @staticmethod
+    def _read(data_path, idx_path, start, stop):
+        """Records start..stop-1, read with one seek into each file."""
+        if stop <= start:
+            return []
+        with open(idx_path, "rb") as idx:
+            idx.seek(start * _ENTRY.size)
+            raw = idx.read((stop - start) * _ENTRY.size)
+        entries = [_ENTRY.unpack_from(raw, i) for i in range(0, len(raw), _ENTRY.size)]
+        if not entries:
+            return []
+        first = entries[0][0]
+        last = entries[-1][0] + entries[-1][1]
+        with open(data_path, "rb") as data:
+            data.seek(first)
+            blob = data.read(last - first)
+        return [json.loads(blob[off - first:off - first + length]) for off, length in entries]
+
+    # --- Writing ---
+    def add_report(self, user, text, source_hash="", filename=""):
+        """Store one uploaded report; returns its metadata record."""
+        os.makedirs(self.directory, exist_ok=True)
+        chunks = split_chunks(text)
+        now = datetime.now()
+        with locked(self.reports_path):
+            report_id = self._count(self.reports_idx)
+            first_chunk = self._count(self.chunks_idx)
+            self._append(self.chunks_path, self.chunks_idx, [
+                {"report_id": report_id, "chunk": i, "text": chunk} for i, chunk in enumerate(chunks)
+            ])
+            meta = {
+                "report_id": report_id,
+                "user": user,
+                "uploaded_at": now.isoformat(timespec="seconds"),
+                "upload_date": str(now.date()),
+                "sha256": source_hash,
+                "filename": filename,
+                "first_chunk": first_chunk,
+                "chunk_count": len(chunks),
+            }
+            # The report index entry is written last, so a crash never exposes half a report
+            self._append(self.reports_path, self.reports_idx, [meta])
+        return meta
+
+    @staticmethod
+    def _overwrite(data_path, idx_path, updates):
+        """Replace records in place, padding each line to its old length so no offset moves."""
+        with open(idx_path, "rb") as idx, open(data_path, "r+b") as data:
+            for position, record in updates:
+                idx.seek(position * _ENTRY.size)
+                offset, length = _ENTRY.unpack(idx.read(_ENTRY.size))
+                line = json.dumps(record, ensure_ascii=False).encode("utf-8")
+                if len(line) >= length:
+                    raise ValueError(f"Record {position} of {data_path} cannot be overwritten in place")
+                data.seek(offset)
+                data.write(line.ljust(length - 1) + b"\n")
+
+    # --- Deletion ---
+    def forget_user(self, user, deleted_at):
+        """Blank out the reports `user` uploaded up to `deleted_at`; returns their chunk numbers.
+
+        Records keep their positions, so report ids, chunk numbers and the
+        search index stay valid; only that user's lines are rewritten.
+        """
+        chunk_nos = []
+        if not self.report_count():
+            return chunk_nos
+        with locked(self.reports_path):
+            for meta in self.all_reports():
+                if meta["user"] != user or meta["uploaded_at"] > deleted_at:
+                    continue
+                first, count = meta["first_chunk"], meta["chunk_count"]
+                self._overwrite(self.chunks_path, self.chunks_idx, [
+                    (first + i, {"report_id": meta["report_id"], "chunk": i, "text": ""}) for i in range(count)
+                ])
+                scrubbed = dict(meta, user=None, uploaded_at="", upload_date="", sha256="", filename="")
+                self._overwrite(self.reports_path, self.reports_idx, [(meta["report_id"], scrubbed)])
+                with self._lock:
+                    self._meta[meta["report_id"]] = scrubbed
+                chunk_nos.extend(range(first, first + count))
+        return chunk_nos
+
+    # --- Reading ---
+    def report_count(self):
+        return self._count(self.reports_idx)
+
+    def get_report(self, report_id):
+        records = self._read(self.reports_path, self.reports_idx, report_id, report_id + 1)
+        return records[0] if records else None
+
+    def get_chunk(self, chunk_no):
+        records = self._read(self.chunks_path, self.chunks_idx, chunk_no, chunk_no + 1)
+        return records[0] if records else None
+
+    def chunks(self, start, stop):
+        """Chunk records start..stop-1 across all reports."""
+        return self._read(self.chunks_path, self.chunks_idx, start, stop)
+
+    def report_chunks(self, report_id, start=0, stop=None):
+        """Chunk texts of one report; start/stop follow slice rules (negatives allowed)."""
+        meta = self.get_report(report_id)
+        if meta is None:
+            return []
+        start, stop, _ = slice(start, stop).indices(meta["chunk_count"])
+        first = meta["first_chunk"]
+        return [c["text"] for c in self.chunks(first + start, first + stop)]
+
+    def report_text(self, report_id):
+        return "\n".join(self.report_chunks(report_id))
+
+    def all_reports(self):
+        """Metadata of every report, oldest first (only new entries are read from disk)."""
+        with self._lock:
+            count = self.report_count()
+            if count > len(self._meta):
+                self._meta.extend(self._read(self.reports_path, self.reports_idx, len(self._meta), count))
+            return list(self._meta)
+
+    def user_reports(self, user):
+        """Metadata of `user`'s reports, newest first."""
+        return [meta for meta in reversed(self.all_reports()) if meta["user"] == user]
+
+    def find_report(self, user, source_hash):
+        for meta in self.user_reports(user):
+            if source_hash and meta["sha256"] == source_hash:
+                return meta
+        return None
+
+    def find_by_hash(self, source_hash):
+        """Newest report of any user made from the file with this hash, so its text can be reused."""
+        for meta in reversed(self.all_reports()):
+            if source_hash and meta["sha256"] == source_hash:
+                return meta
+        return None
+
+
+_stores = {}
+
+
+def get_store(directory=REPORT_STORE_DIR):
+    store = _stores.get(directory)
+    if store is None:
+        store = _stores.setdefault(directory, ReportStore(directory))
+    return store
+
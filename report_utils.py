@@ -1,18 +1,19 @@
 # utils/report_utils.py
-from config import REPORT_FILE
-import os
+from storage import report_store
+from report_index import get_index
+from pdf_extract import extract_text
 
-def append_report_text(text):
-    with open(REPORT_FILE, "a") as f:
-        f.write("\n\n" + text.strip())
+def append_report_text(text, user="", source_hash="", filename=""):
+    meta = report_store().add_report(user, text.strip(), source_hash=source_hash, filename=filename)
+    get_index().sync(save=True)
+    return meta
 
-def get_report_memory():
-    if os.path.exists(REPORT_FILE):
-        with open(REPORT_FILE, "r") as f:
-            return f.read()
+def get_report_memory(user=None):
+    store = report_store()
+    reports = store.user_reports(user) if user is not None else list(reversed(store.all_reports()))
+    if reports:
+        return store.report_text(reports[0]["report_id"])
     return ""
 
 def extract_text_from_pdf(file):
-    import PyPDF2
-    reader = PyPDF2.PdfReader(file)
-    return "\n".join([page.extract_text() for page in reader.pages if page.extract_text()])
\ No newline at end of file
+    return extract_text(file)
\ No newline at end of file
@@ -0,0 +1,113 @@
+# response_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+RESPONSE_CACHE_FILE = "response_cache.sqlite"
+DEFAULT_TTL = float(os.getenv("GLUTENY_CACHE_TTL", 7 * 24 * 3600))
+DEFAULT_MAX_BYTES = int(os.getenv("GLUTENY_CACHE_MAX_BYTES", 20 * 1024 * 1024))
+
+
+def cache_key(model, full_context, user_input):
+    payload = json.dumps([model, full_context, user_input], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Persistent cache of coach answers keyed on (model, system context, question).
+
+    Entries expire after `ttl` seconds, and the least recently used ones are
+    evicted once the stored answers exceed `max_bytes`.
+    """
+
+    def __init__(self, path=RESPONSE_CACHE_FILE, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, answer TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(responses)")}
+        if "user" not in columns:
+            # Caches created before answers were tagged with their user
+            self._conn.execute("ALTER TABLE responses ADD COLUMN user TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_user ON responses (user)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT answer, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, answer, user=""):
+        now = time.time()
+        size = len(answer.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, answer, size, created, last_used, user) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, answer, size, now, now, user),
+            )
+            self._evict(now)
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used answers until the store fits again
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def forget_user(self, user):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE user = ?", (user,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
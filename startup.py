@@ -0,0 +1,111 @@
+# startup.py
+"""Cold start of the Streamlit entry point.
+
+The first page only needs Streamlit, the user profiles and the reply cache;
+pandas and openai are imported on first use. warm_up() imports them in the
+background once the first page is out, so the first question does not wait
+for them either.
+
+launch.sh and index.js poll Streamlit's own health endpoint,
+http://localhost:<port>/_stcore/health, instead of sleeping: it answers
+"ok" as soon as the server accepts connections.
+
+Usage:
+    python startup.py report    # import cost of the entry point, per module
+"""
+import ast
+import importlib
+import re
+import subprocess
+import sys
+import threading
+
+ENTRY_POINT = "nutrition_assistant.py"
+# Imported on first use by the app; warm_up() loads them ahead of the first question
+DEFERRED_MODULES = ["pandas", "numpy", "openai", "dateutil.parser"]
+
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+_warm_lock = threading.Lock()
+_warm_thread = None
+
+
+def _warm(modules):
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass  # the code that needs it reports the error when it runs
+
+
+def warm_up(modules=DEFERRED_MODULES):
+    """Import `modules` on a background thread, once per process."""
+    global _warm_thread
+    with _warm_lock:
+        if _warm_thread is None:
+            _warm_thread = threading.Thread(target=_warm, args=(list(modules),), name="gluteny-warm-up", daemon=True)
+            _warm_thread.start()
+        return _warm_thread
+
+
+def entry_imports(path=ENTRY_POINT):
+    """Top-level modules imported by the module-level code of `path`, in order."""
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        modules.extend(name for name in names if name not in modules)
+    return modules
+
+
+def import_costs(modules):
+    """[(module, cumulative ms)] for each of `modules`, imported in a fresh interpreter.
+
+    A module only pays for what earlier ones have not imported yet, as in the app.
+    """
+    code = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    costs = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        # Only unindented entries: those are imported by the -c code itself
+        if match and len(match.group(3)) == 1:
+            costs[match.group(4)] = int(match.group(2)) / 1000
+    return [(module, costs.get(module, 0.0)) for module in modules]
+
+
+def loaded_after(modules, candidates=DEFERRED_MODULES):
+    """The `candidates` that importing `modules` already pulls in."""
+    code = f"import sys; {'; '.join(f'import {module}' for module in modules)}; print(' '.join(sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    loaded = set(result.stdout.split())
+    return [module for module in candidates if module in loaded]
+
+
+def report(path=ENTRY_POINT):
+    modules = entry_imports(path)
+    costs = import_costs(modules)
+    total = sum(ms for _, ms in costs)
+    width = max(len(module) for module in modules)
+    print(f"Import cost of {path} ({len(modules)} modules, {total:.0f} ms):")
+    for module, ms in sorted(costs, key=lambda cost: cost[1], reverse=True):
+        print(f"  {module:<{width}}  {ms:8.1f} ms  {ms / total:6.1%}" if total else f"  {module}")
+    eager = loaded_after(modules)
+    print("Deferred until first use:", ", ".join(m for m in DEFERRED_MODULES if m not in eager) or "none")
+    if eager:
+        print("Still imported at startup:", ", ".join(eager))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "report":
+        print(__doc__)
+        sys.exit(1)
+    report()
@@ -0,0 +1,623 @@
+# storage.py
+"""Storage backends for user profiles, the meal and symptom logs and reports.
+
+GLUTENY_STORAGE picks the backend for the whole app:
+    csv          user_profiles.json, meal_log.csv, symptom_log.csv and report_store/ (default)
+    partitioned  the same, but the logs split per user and month (see partitioned_log.py)
+    sqlite       one SQLite database (GLUTENY_DB, default gluteny.sqlite) in WAL mode
+    parquet      the same files, but the logs kept as typed monthly Parquet snapshots plus an append log (see parquet_log.py)
+
+All answer the same calls, so pages and helpers never touch the files directly.
+
+Usage:
+    python storage.py migrate    # copy the CSV/JSON files and report store into the database
+"""
+import csv
+import json
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import meal_parser
+import tombstones
+from log_cache import SYMPTOM_LOG_FILE, SYMPTOM_COLUMNS, load_log
+from meal_store import MEAL_LOG_FILE, MEAL_COLUMNS, append_row, atomic_write_json, locked, open_log as open_csv_log, remove_rows
+from parquet_log import available as parquet_available, meal_snapshots, symptom_snapshots
+from partitioned_log import meal_partitions, symptom_partitions
+from report_store import REPORT_STORE_DIR, get_store, split_chunks
+from tracing import span
+
+USER_FILE = "user_profiles.json"
+DB_FILE = os.getenv("GLUTENY_DB", "gluteny.sqlite")
+STORAGE_BACKEND = os.getenv("GLUTENY_STORAGE", "csv").lower()
+BUSY_TIMEOUT = 10  # seconds a writer waits for another writer's transaction
+
+REPORT_FIELDS = ["report_id", "user", "uploaded_at", "upload_date", "sha256", "filename", "first_chunk", "chunk_count"]
+
+
+# --- CSV / JSON files ---
+class VisibleLog:
+    """An IndexedLog without the rows of deleted users that compaction has not removed yet."""
+
+    def __init__(self, log, deleted):
+        self.log = log
+        self.deleted = deleted
+        self.columns = log.columns
+
+    def _visible(self, user, frame):
+        deleted_at = self.deleted.get(user)
+        if deleted_at is None or frame.empty:
+            return frame
+        return frame[frame["timestamp"] > deleted_at]
+
+    @property
+    def empty(self):
+        return not self.users()
+
+    def users(self):
+        return [user for user in self.log.users() if user not in self.deleted or not self.for_user(user).empty]
+
+    def for_user(self, user, since=None):
+        return self._visible(user, self.log.for_user(user, since))
+
+    def on_date(self, user, date_str):
+        return self._visible(user, self.log.on_date(user, date_str))
+
+    def recent(self, user, n):
+        return self.for_user(user).tail(n)
+
+
+class CsvStorage:
+    name = "csv"
+
+    def load_profiles(self):
+        if os.path.exists(USER_FILE):
+            with open(USER_FILE, "r") as f:
+                return json.load(f)
+        return {}
+
+    def _write_profiles(self, profiles):
+        atomic_write_json(USER_FILE, profiles)
+
+    def save_profiles(self, profiles):
+        with locked(USER_FILE):
+            self._write_profiles(profiles)
+
+    def save_profile(self, name, profile):
+        with locked(USER_FILE):
+            profiles = self.load_profiles()
+            profiles[name] = profile
+            self._write_profiles(profiles)
+
+    def delete_profile(self, name):
+        with locked(USER_FILE):
+            profiles = self.load_profiles()
+            if profiles.pop(name, None) is not None:
+                self._write_profiles(profiles)
+
+    def open_log(self):
+        open_csv_log(MEAL_LOG_FILE, MEAL_COLUMNS)
+
+    def append_meal(self, entry):
+        append_row(entry, MEAL_LOG_FILE, MEAL_COLUMNS)
+
+    def append_symptom(self, entry):
+        append_row(entry, SYMPTOM_LOG_FILE, SYMPTOM_COLUMNS)
+
+    def delete_user_rows(self, name, deleted_at):
+        pass  # The tombstone hides the rows; compact_logs() removes them
+
+    def compact_logs(self, deleted):
+        def drop(row):
+            deleted_at = deleted.get(row["name"])
+            return deleted_at is not None and (row["timestamp"] or "") <= deleted_at
+
+        return remove_rows(MEAL_LOG_FILE, MEAL_COLUMNS, drop) + remove_rows(SYMPTOM_LOG_FILE, SYMPTOM_COLUMNS, drop)
+
+    def _log(self, path, columns):
+        log = load_log(path, columns)
+        deleted = tombstones.load()
+        return VisibleLog(log, deleted) if deleted else log
+
+    def meal_log(self):
+        return self._log(MEAL_LOG_FILE, MEAL_COLUMNS)
+
+    def symptom_log(self):
+        return self._log(SYMPTOM_LOG_FILE, SYMPTOM_COLUMNS)
+
+    def report_store(self):
+        return get_store(REPORT_STORE_DIR)
+
+
+class PartitionedStorage(CsvStorage):
+    """CSV files like CsvStorage, but the logs are split per user and month (see partitioned_log.py)."""
+
+    name = "partitioned"
+
+    def __init__(self):
+        self.meals = meal_partitions()
+        self.symptoms = symptom_partitions()
+
+    def open_log(self):
+        pass  # Partitions are created with their first row
+
+    def append_meal(self, entry):
+        self.meals.append(entry)
+
+    def append_symptom(self, entry):
+        self.symptoms.append(entry)
+
+    def delete_user_rows(self, name, deleted_at):
+        # The user's partitions hold nobody else's rows, so they are simply removed
+        self.meals.delete_user(name)
+        self.symptoms.delete_user(name)
+
+    def compact_logs(self, deleted):
+        return 0
+
+    def meal_log(self):
+        return self.meals
+
+    def symptom_log(self):
+        return self.symptoms
+
+
+class ParquetStorage(CsvStorage):
+    """CSV/JSON files like CsvStorage, but the logs are Parquet snapshots plus an append log (see parquet_log.py)."""
+
+    name = "parquet"
+
+    def __init__(self):
+        if not parquet_available():
+            raise ImportError("GLUTENY_STORAGE=parquet needs pyarrow: pip install pyarrow")
+        self.meals = meal_snapshots()
+        self.symptoms = symptom_snapshots()
+
+    def open_log(self):
+        pass  # The append log is created with its first row
+
+    def append_meal(self, entry):
+        self.meals.append(entry)
+
+    def append_symptom(self, entry):
+        self.symptoms.append(entry)
+
+    def compact_logs(self, deleted):
+        # On the snapshot worker, so it never overlaps a compaction started by a write
+        return sum(log.schedule_compaction(deleted).result() for log in (self.meals, self.symptoms))
+
+    def _visible(self, log):
+        deleted = tombstones.load()
+        return VisibleLog(log, deleted) if deleted else log
+
+    def meal_log(self):
+        return self._visible(self.meals)
+
+    def symptom_log(self):
+        return self._visible(self.symptoms)
+
+
+# --- SQLite ---
+def _log_table(table, columns):
+    fields = ", ".join(f"{col} TEXT NOT NULL DEFAULT ''" for col in columns)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, {fields});\n"
+        f"CREATE INDEX IF NOT EXISTS {table}_name_date ON {table} (name, date);\n"
+    )
+
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS profiles (name TEXT PRIMARY KEY, profile TEXT NOT NULL DEFAULT '');\n"
+    + _log_table("meals", MEAL_COLUMNS)
+    + _log_table("symptoms", SYMPTOM_COLUMNS)
+    + "CREATE TABLE IF NOT EXISTS reports ("
+    " report_id INTEGER PRIMARY KEY, user TEXT, uploaded_at TEXT NOT NULL, upload_date TEXT NOT NULL,"
+    " sha256 TEXT NOT NULL, filename TEXT NOT NULL, first_chunk INTEGER NOT NULL, chunk_count INTEGER NOT NULL);\n"
+    "CREATE INDEX IF NOT EXISTS reports_user ON reports (user, report_id);\n"
+    "CREATE TABLE IF NOT EXISTS report_chunks ("
+    " chunk_no INTEGER PRIMARY KEY, report_id INTEGER NOT NULL, chunk INTEGER NOT NULL, text TEXT NOT NULL);\n"
+)
+
+
+class Database:
+    """One SQLite connection per thread, so readers never queue behind each other in WAL mode."""
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._local = threading.local()
+        conn = self.connection()
+        conn.executescript(_SCHEMA)
+        # Databases created before a log column existed get it added, empty
+        for table, columns in (("meals", MEAL_COLUMNS), ("symptoms", SYMPTOM_COLUMNS)):
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for col in columns:
+                if col not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} TEXT NOT NULL DEFAULT ''")
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def query(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchall()
+
+
+class SQLiteLog:
+    """Same read interface as log_cache.IndexedLog, answered by indexed queries."""
+
+    def __init__(self, db, table, columns):
+        self.db = db
+        self.table = table
+        self.columns = list(columns)
+        self._select = f"SELECT {', '.join(columns)} FROM {table}"
+
+    def _frame(self, where, params):
+        import pandas as pd
+
+        with span("sqlite.query", table=self.table) as s:
+            rows = self.db.query(f"{self._select} {where}", params)
+            s.set(rows=len(rows))
+        return pd.DataFrame(rows, columns=self.columns, dtype=str)
+
+    @property
+    def empty(self):
+        return not self.db.query(f"SELECT 1 FROM {self.table} LIMIT 1")
+
+    def users(self):
+        return [name for (name,) in self.db.query(f"SELECT DISTINCT name FROM {self.table}")]
+
+    def for_user(self, user, since=None):
+        """All rows for `user`, oldest date first."""
+        if since:
+            return self._frame("WHERE name = ? AND date >= ? ORDER BY date, id", (user, since))
+        return self._frame("WHERE name = ? ORDER BY date, id", (user,))
+
+    def on_date(self, user, date_str):
+        return self._frame("WHERE name = ? AND date = ? ORDER BY id", (user, date_str))
+
+    def recent(self, user, n):
+        frame = self._frame("WHERE name = ? ORDER BY date DESC, id DESC LIMIT ?", (user, n))
+        return frame.iloc[::-1].reset_index(drop=True)
+
+    def delete_user(self, user, deleted_at):
+        with self.db.transaction() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE name = ? AND timestamp <= ?", (user, deleted_at))
+
+    def append(self, entry):
+        values = [entry.get(col) or "" for col in self.columns]
+        with self.db.transaction() as conn:
+            conn.execute(
+                f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES ({', '.join('?' * len(self.columns))})",
+                values,
+            )
+
+
+class SQLiteReportStore:
+    """ReportStore interface on top of the reports and report_chunks tables."""
+
+    def __init__(self, db):
+        self.db = db
+        # The BM25 snapshot goes next to the database
+        self.directory = os.path.dirname(db.path) or "."
+        self._meta = []
+        self._lock = threading.Lock()
+        self._select = f"SELECT {', '.join(REPORT_FIELDS)} FROM reports"
+
+    def _reports(self, where, params):
+        return [dict(zip(REPORT_FIELDS, row)) for row in self.db.query(f"{self._select} {where}", params)]
+
+    def add_report(self, user, text, source_hash="", filename=""):
+        chunks = split_chunks(text)
+        now = datetime.now()
+        with self.db.transaction() as conn:
+            report_id = conn.execute("SELECT COALESCE(MAX(report_id) + 1, 0) FROM reports").fetchone()[0]
+            first_chunk = conn.execute("SELECT COALESCE(MAX(chunk_no) + 1, 0) FROM report_chunks").fetchone()[0]
+            conn.executemany(
+                "INSERT INTO report_chunks (chunk_no, report_id, chunk, text) VALUES (?, ?, ?, ?)",
+                [(first_chunk + i, report_id, i, chunk) for i, chunk in enumerate(chunks)],
+            )
+            meta = {
+                "report_id": report_id,
+                "user": user,
+                "uploaded_at": now.isoformat(timespec="seconds"),
+                "upload_date": str(now.date()),
+                "sha256": source_hash,
+                "filename": filename,
+                "first_chunk": first_chunk,
+                "chunk_count": len(chunks),
+            }
+            conn.execute(
+                f"INSERT INTO reports ({', '.join(REPORT_FIELDS)}) VALUES ({', '.join('?' * len(REPORT_FIELDS))})",
+                [meta[field] for field in REPORT_FIELDS],
+            )
+        return meta
+
+    def forget_user(self, user, deleted_at):
+        """Blank out the reports `user` uploaded up to `deleted_at`; returns their chunk numbers."""
+        chunk_nos = []
+        with self.db.transaction() as conn:
+            rows = conn.execute(
+                "SELECT report_id, first_chunk, chunk_count FROM reports WHERE user = ? AND uploaded_at <= ?",
+                (user, deleted_at),
+            ).fetchall()
+            for report_id, first, count in rows:
+                conn.execute("UPDATE report_chunks SET text = '' WHERE chunk_no >= ? AND chunk_no < ?", (first, first + count))
+                conn.execute(
+                    "UPDATE reports SET user = NULL, uploaded_at = '', upload_date = '', sha256 = '', filename = ''"
+                    " WHERE report_id = ?",
+                    (report_id,),
+                )
+                chunk_nos.extend(range(first, first + count))
+        with self._lock:
+            for report_id, _, _ in rows:
+                if report_id < len(self._meta):
+                    self._meta[report_id] = dict(self._meta[report_id], user=None, uploaded_at="", upload_date="", sha256="", filename="")
+        return chunk_nos
+
+    def report_count(self):
+        return self.db.query("SELECT COUNT(*) FROM reports")[0][0]
+
+    def get_report(self, report_id):
+        reports = self._reports("WHERE report_id = ?", (report_id,))
+        return reports[0] if reports else None
+
+    def get_chunk(self, chunk_no):
+        chunks = self.chunks(chunk_no, chunk_no + 1)
+        return chunks[0] if chunks else None
+
+    def chunks(self, start, stop):
+        rows = self.db.query(
+            "SELECT report_id, chunk, text FROM report_chunks WHERE chunk_no >= ? AND chunk_no < ? ORDER BY chunk_no",
+            (start, stop),
+        )
+        return [{"report_id": report_id, "chunk": chunk, "text": text} for report_id, chunk, text in rows]
+
+    def report_chunks(self, report_id, start=0, stop=None):
+        meta = self.get_report(report_id)
+        if meta is None:
+            return []
+        start, stop, _ = slice(start, stop).indices(meta["chunk_count"])
+        first = meta["first_chunk"]
+        return [c["text"] for c in self.chunks(first + start, first + stop)]
+
+    def report_text(self, report_id):
+        return "\n".join(self.report_chunks(report_id))
+
+    def all_reports(self):
+        with self._lock:
+            self._meta.extend(self._reports("WHERE report_id >= ? ORDER BY report_id", (len(self._meta),)))
+            return list(self._meta)
+
+    def user_reports(self, user):
+        return self._reports("WHERE user = ? ORDER BY report_id DESC", (user,))
+
+    def find_report(self, user, source_hash):
+        if not source_hash:
+            return None
+        reports = self._reports("WHERE user = ? AND sha256 = ? ORDER BY report_id DESC LIMIT 1", (user, source_hash))
+        return reports[0] if reports else None
+
+    def find_by_hash(self, source_hash):
+        if not source_hash:
+            return None
+        reports = self._reports("WHERE sha256 = ? ORDER BY report_id DESC LIMIT 1", (source_hash,))
+        return reports[0] if reports else None
+
+
+class SQLiteStorage:
+    name = "sqlite"
+
+    def __init__(self, path=DB_FILE):
+        self.db = Database(path)
+        self.meals = SQLiteLog(self.db, "meals", MEAL_COLUMNS)
+        self.symptoms = SQLiteLog(self.db, "symptoms", SYMPTOM_COLUMNS)
+        self.reports = SQLiteReportStore(self.db)
+
+    def load_profiles(self):
+        return dict(self.db.query("SELECT name, profile FROM profiles ORDER BY rowid"))
+
+    def save_profiles(self, profiles):
+        with self.db.transaction() as conn:
+            existing = {name for (name,) in conn.execute("SELECT name FROM profiles")}
+            conn.executemany("DELETE FROM profiles WHERE name = ?", [(name,) for name in existing - set(profiles)])
+            conn.executemany(
+                "INSERT INTO profiles (name, profile) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET profile = excluded.profile",
+                list(profiles.items()),
+            )
+
+    def save_profile(self, name, profile):
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO profiles (name, profile) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET profile = excluded.profile",
+                (name, profile),
+            )
+
+    def delete_profile(self, name):
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM profiles WHERE name = ?", (name,))
+
+    def open_log(self):
+        pass  # The schema is created when the database is opened
+
+    def append_meal(self, entry):
+        self.meals.append(entry)
+
+    def append_symptom(self, entry):
+        self.symptoms.append(entry)
+
+    def delete_user_rows(self, name, deleted_at):
+        # Indexed deletes touch only this user's rows, so there is nothing left to compact
+        self.meals.delete_user(name, deleted_at)
+        self.symptoms.delete_user(name, deleted_at)
+
+    def compact_logs(self, deleted):
+        return 0
+
+    def meal_log(self):
+        return self.meals
+
+    def symptom_log(self):
+        return self.symptoms
+
+    def report_store(self):
+        return self.reports
+
+
+# --- Backend selection ---
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if STORAGE_BACKEND == "sqlite":
+                    _backend = SQLiteStorage()
+                elif STORAGE_BACKEND == "partitioned":
+                    _backend = PartitionedStorage()
+                elif STORAGE_BACKEND == "parquet":
+                    _backend = ParquetStorage()
+                elif STORAGE_BACKEND == "csv":
+                    _backend = CsvStorage()
+                else:
+                    raise ValueError(f"Unknown GLUTENY_STORAGE backend: {STORAGE_BACKEND!r} (use 'csv', 'partitioned', 'sqlite' or 'parquet')")
+    return _backend
+
+
+def load_user_profiles():
+    return get_backend().load_profiles()
+
+
+def save_user_profiles(profiles):
+    get_backend().save_profiles(profiles)
+
+
+def save_user_profile(name, profile):
+    get_backend().save_profile(name, profile)
+
+
+def delete_user_profile(name):
+    get_backend().delete_profile(name)
+
+
+def open_log():
+    """Create the meal log or repair its columns."""
+    get_backend().open_log()
+
+
+def append_meal(entry):
+    """Append a meal row, parsing its text into entry["ingredients"] first if it has none."""
+    if not entry.get("ingredients"):
+        entry["ingredients"] = meal_parser.ingredients(entry.get("meal", ""))
+    get_backend().append_meal(entry)
+
+
+def append_symptom(entry):
+    get_backend().append_symptom(entry)
+
+
+def delete_user_rows(name, deleted_at):
+    """Remove or hide the log rows `name` wrote up to `deleted_at`."""
+    get_backend().delete_user_rows(name, deleted_at)
+
+
+def compact_logs(deleted):
+    """Physically drop rows hidden by the {user: deleted_at} tombstones; returns how many went."""
+    return get_backend().compact_logs(deleted)
+
+
+def meal_log():
+    return get_backend().meal_log()
+
+
+def symptom_log():
+    return get_backend().symptom_log()
+
+
+def report_store():
+    return get_backend().report_store()
+
+
+# --- Migration ---
+def _copy_log(path, log):
+    if not log.empty:
+        return f"{log.table}: database already has rows, skipped"
+    if not os.path.exists(path):
+        return f"{log.table}: {path} not found, skipped"
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        rows = [[row.get(col) or "" for col in log.columns] for row in csv.DictReader(f)]
+    with log.db.transaction() as conn:
+        conn.executemany(
+            f"INSERT INTO {log.table} ({', '.join(log.columns)}) VALUES ({', '.join('?' * len(log.columns))})",
+            rows,
+        )
+    return f"{log.table}: copied {len(rows)} rows"
+
+
+def _copy_reports(source, target):
+    if target.report_count():
+        return "reports: database already has reports, skipped"
+    reports = source.all_reports()
+    with target.db.transaction() as conn:
+        for meta in reports:
+            # Report ids and chunk numbers are kept, so an existing BM25 snapshot still lines up
+            chunks = source.chunks(meta["first_chunk"], meta["first_chunk"] + meta["chunk_count"])
+            conn.executemany(
+                "INSERT INTO report_chunks (chunk_no, report_id, chunk, text) VALUES (?, ?, ?, ?)",
+                [(meta["first_chunk"] + c["chunk"], meta["report_id"], c["chunk"], c["text"]) for c in chunks],
+            )
+            conn.execute(
+                f"INSERT INTO reports ({', '.join(REPORT_FIELDS)}) VALUES ({', '.join('?' * len(REPORT_FIELDS))})",
+                [meta[field] for field in REPORT_FIELDS],
+            )
+    return f"reports: copied {len(reports)} reports"
+
+
+def migrate(path=DB_FILE):
+    """Copy the file-based stores into the SQLite database at `path`.
+
+    Profiles are merged; logs and reports are only copied into empty tables,
+    so running it twice never duplicates rows. The legacy report_memory.txt
+    is left where it is and is still read as a fallback.
+    """
+    source = CsvStorage()
+    target = SQLiteStorage(path)
+    profiles = target.load_profiles()
+    profiles.update(source.load_profiles())
+    target.save_profiles(profiles)
+    return [
+        f"profiles: {len(profiles)} users",
+        _copy_log(MEAL_LOG_FILE, target.meals),
+        _copy_log(SYMPTOM_LOG_FILE, target.symptoms),
+        _copy_reports(source.report_store(), target.reports),
+    ]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print(__doc__)
+        sys.exit(1)
+    for line in migrate():
+        print(line)
+    print(f"Done. Set GLUTENY_STORAGE=sqlite to use {DB_FILE}.")
@@ -0,0 +1,225 @@
+# symptom_insights.py
+import meal_parser
+from tracing import traced
+
+# numpy and pandas are imported on first use: ingredients_of and symptoms_of do not need them
+
+# Hour of day assumed for a meal logged on a different day than it was eaten
+MEAL_HOURS = {"Breakfast": 8, "Lunch": 13, "Snack": 16, "Dinner": 19}
+DEFAULT_HOUR = 12
+
+# The symptoms offered on the log form, which also adds "Other"
+SYMPTOMS = ["Bloating", "Fatigue", "Headache", "Gas", "Skin rash", "Brain fog", "Acidity"]
+
+# Seconds between two users' time ranges in the combined sort key (about 300 years)
+_USER_SPAN = 10_000_000_000
+
+# The name in one item of meal_parser's stored form, e.g. "dal" in "dal:1bowl"
+_STORED_NAME = r"^([^:]+):[\d.]+[a-z]*$"
+
+RESULT_COLUMNS = ["name", "symptom", "ingredient", "count", "meals_with_ingredient", "meals_with_symptom", "lift"]
+
+
+def ingredients_of(meal_text, stored=""):
+    """Distinct ingredients of one meal: its stored ingredients, or parsed from `meal_text`."""
+    return list(meal_parser.names_of(stored, meal_text))
+
+
+def symptoms_of(symptom_text):
+    return sorted({part.strip() for part in symptom_text.split(",") if part.strip()})
+
+
+def _explode_unique(values, split):
+    """(position, part) rows for a Series of strings, splitting each distinct string once."""
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(values)
+    parts = split(pd.Series(uniques, dtype=object)).explode().str.strip()
+    parts = parts[parts.notna() & (parts != "")]
+    table = pd.DataFrame({"code": parts.index.to_numpy(), "part": parts.to_numpy()}).drop_duplicates()
+    rows = pd.DataFrame({"event": np.arange(len(codes)), "code": codes})
+    return rows.merge(table, on="code")[["event", "part"]]
+
+
+def split_ingredients(meals, stored=None):
+    """Explode meals into one (event, ingredient) row per ingredient.
+
+    `stored` is the meal log's ingredients column; only meals logged before
+    it existed have their text parsed, once per distinct text.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if meals.empty:
+        return pd.DataFrame({"event": pd.Series(dtype="int64"), "ingredient": pd.Series(dtype=object)})
+    texts = meals.fillna("").to_numpy(dtype=object)
+    if stored is None:
+        encoded = np.full(len(texts), "", dtype=object)
+    else:
+        encoded = stored.fillna("").to_numpy(dtype=object, copy=True)
+    missing = encoded == ""
+    if missing.any():
+        codes, uniques = pd.factorize(texts[missing])
+        parsed = np.array([meal_parser.ingredients(text) for text in uniques], dtype=object)
+        encoded[missing] = parsed[codes]
+    codes, uniques = pd.factorize(encoded)
+    # One split over all distinct values; a value with n separators holds n + 1 items
+    items = np.array(";".join(uniques).split(";"), dtype=object)
+    item_value = np.repeat(np.arange(len(uniques)), [value.count(";") + 1 for value in uniques])
+    # Stored values are nearly unique per meal, but their "name:qty" items repeat, so each distinct
+    # item is matched once here rather than decoding every meal in Python
+    item_codes, distinct = pd.factorize(items)
+    names = pd.Series(distinct, dtype=object).str.extract(_STORED_NAME, expand=False)
+    name_codes, ingredients = pd.factorize(names)
+    # Items not in the stored form have no name (code -1); a meal listing a name twice counts once
+    per_value = pd.DataFrame({"value": item_value, "name": name_codes[item_codes]})
+    per_value = per_value[per_value["name"] >= 0].drop_duplicates()
+    rows = pd.DataFrame({"event": np.arange(len(codes)), "value": codes}).merge(per_value, on="value")
+    return pd.DataFrame({
+        "event": rows["event"].to_numpy(),
+        "ingredient": pd.Categorical.from_codes(rows["name"].to_numpy(), categories=pd.Index(ingredients, dtype=object)),
+    })
+
+
+def _split_symptoms(symptoms):
+    rows = _explode_unique(symptoms, lambda s: s.str.split(","))
+    return rows.rename(columns={"part": "symptom"})
+
+
+def _event_seconds(df):
+    """Epoch seconds of each event: its timestamp if logged that day, else a typical hour of the day."""
+    import pandas as pd
+
+    when = pd.to_datetime(df["timestamp"], format="%Y-%m-%dT%H:%M:%S", errors="coerce")
+    # Almost every event is logged on its own day; only the others need their date parsed
+    other = ~((df["timestamp"].str.slice(0, 10) == df["date"]) & when.notna())
+    if other.any():
+        rest = df[other]
+        day = pd.to_datetime(rest["date"], format="%Y-%m-%d", errors="coerce")
+        stamp = when[other]
+        hours = rest["meal_type"].map(MEAL_HOURS).fillna(DEFAULT_HOUR) if "meal_type" in rest.columns else DEFAULT_HOUR
+        fallback = day + pd.to_timedelta(hours, unit="h")
+        when = when.copy()
+        when[other] = stamp.where(stamp.notna() & (stamp.dt.normalize() == day), fallback)
+    return (when - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1)
+
+
+def _symptom_events(meals, symptoms):
+    """Symptom events from the symptom log plus meal rows that recorded symptoms."""
+    import pandas as pd
+
+    frames = [symptoms[["timestamp", "date", "name", "symptoms"]]]
+    if "symptoms" in meals.columns:
+        frames.append(meals.loc[meals["symptoms"].fillna("") != "", ["timestamp", "date", "name", "symptoms", "meal_type"]])
+    events = pd.concat(frames, ignore_index=True)
+    # add_test_data.py (and older versions of the log form) wrote the same event to both files
+    events = events.drop_duplicates(subset=["timestamp", "date", "name", "symptoms"]).reset_index(drop=True)
+    return events
+
+
+def _window_pairs(meal_keys, symptom_keys, window):
+    """(meal position, symptom position) for every meal in the `window` seconds before a symptom."""
+    import numpy as np
+
+    order = np.argsort(meal_keys, kind="stable")
+    sorted_keys = meal_keys[order]
+    lo = np.searchsorted(sorted_keys, symptom_keys - window, side="left")
+    hi = np.searchsorted(sorted_keys, symptom_keys, side="right")
+    counts = hi - lo
+    total = int(counts.sum())
+    symptom_pos = np.repeat(np.arange(len(symptom_keys)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    meal_pos = order[np.repeat(lo, counts) + offsets]
+    return meal_pos, symptom_pos
+
+
+@traced("insights.correlate")
+def correlate(meals, symptoms, window_hours=None):
+    """Co-occurrence counts and lift of (symptom, ingredient) per user.
+
+    A meal counts towards a symptom when that symptom was logged on the same
+    date, or, with `window_hours`, within that many hours after the meal.
+    `count` is the number of such meals containing the ingredient; `lift` is
+    how much more often the symptom follows meals with that ingredient than
+    meals in general.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if meals.empty:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    meals = meals.reset_index(drop=True)
+    users = pd.Categorical(meals["name"])
+    events = _symptom_events(meals, symptoms)
+    events = events[events["name"].isin(users.categories)].reset_index(drop=True)
+
+    stored = meals["ingredients"] if "ingredients" in meals.columns else None
+    meal_ing = split_ingredients(meals["meal"], stored).rename(columns={"event": "meal"})
+    event_sym = _split_symptoms(events["symptoms"].fillna(""))
+
+    if window_hours is None:
+        # Distinct (user, date, symptom) joined to that day's meals
+        positions = event_sym["event"].to_numpy()
+        day_sym = pd.DataFrame({
+            "name": events["name"].to_numpy()[positions],
+            "date": events["date"].to_numpy()[positions],
+            "symptom": event_sym["symptom"].to_numpy(),
+        }).drop_duplicates()
+        meal_days = pd.DataFrame({"meal": meals.index, "name": meals["name"], "date": meals["date"]})
+        meal_sym = meal_days.merge(day_sym, on=["name", "date"])[["meal", "symptom"]]
+    else:
+        event_users = pd.Categorical(events["name"], categories=users.categories)
+        meal_keys = users.codes.astype("int64") * _USER_SPAN + _event_seconds(meals).fillna(-_USER_SPAN).to_numpy("int64")
+        symptom_keys = event_users.codes.astype("int64") * _USER_SPAN + _event_seconds(events).fillna(-_USER_SPAN).to_numpy("int64")
+        meal_pos, event_pos = _window_pairs(meal_keys, symptom_keys, int(window_hours * 3600))
+        pairs = pd.DataFrame({"meal": meal_pos, "event": event_pos})
+        # Two events with the same symptom after one meal count once; the daily join is already distinct
+        meal_sym = pairs.merge(event_sym, on="event")[["meal", "symptom"]].drop_duplicates()
+
+    # Categorical user/ingredient/symptom columns keep the groupbys below cheap
+    meal_names = users
+    meal_ing["name"] = meal_names[meal_ing["meal"].to_numpy()]
+    meal_ing["ingredient"] = meal_ing["ingredient"].astype("category")
+    meal_sym["name"] = meal_names[meal_sym["meal"].to_numpy()]
+    meal_sym["symptom"] = meal_sym["symptom"].astype("category")
+
+    co = (
+        meal_sym.merge(meal_ing[["meal", "ingredient"]], on="meal")
+        .groupby(["name", "symptom", "ingredient"], observed=True).size()
+        .rename("count")
+    )
+    if co.empty:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    with_ing = meal_ing.groupby(["name", "ingredient"], observed=True).size().rename("meals_with_ingredient")
+    with_sym = meal_sym.groupby(["name", "symptom"], observed=True).size().rename("meals_with_symptom")
+    meal_users = users.codes[users.codes >= 0]
+    n_meals = pd.Series(
+        np.bincount(meal_users, minlength=len(users.categories)),
+        index=pd.CategoricalIndex(users.categories, categories=users.categories), name="meals",
+    )
+
+    stats = co.reset_index()
+    stats = stats.join(with_ing, on=["name", "ingredient"]).join(with_sym, on=["name", "symptom"]).join(n_meals, on="name")
+    stats["lift"] = stats["count"] * stats["meals"] / (stats["meals_with_ingredient"] * stats["meals_with_symptom"])
+    stats = stats.astype({"name": str, "symptom": str, "ingredient": str})
+    return stats[RESULT_COLUMNS].sort_values(
+        ["name", "symptom", "count", "lift", "ingredient"], ascending=[True, True, False, False, True], ignore_index=True
+    )
+
+
+def insight_text(stats, top_n=2):
+    """Format correlate() output for one user the way the coach prompt expects."""
+    if stats.empty:
+        return ""
+    order = stats.groupby("symptom")["meals_with_symptom"].first().sort_values(ascending=False, kind="stable").index
+    insight = ""
+    for symptom in order:
+        top = stats[stats["symptom"] == symptom].head(top_n)
+        insight += f"🔁 **{symptom}** has occurred after meals like:\n"
+        for row in top.itertuples(index=False):
+            insight += f"• {row.ingredient} ({row.count} times)\n"
+        insight += "\n"
+    return insight.strip()
@@ -0,0 +1,201 @@
+# synth_data.py
+"""Seeded synthetic data at any scale, in every storage format.
+
+Each user gets a profile with a condition, two to four meals a day made of
+foods typical for the meal type, and symptoms that mostly follow that
+user's trigger foods (so the insights have something to find), plus a lab
+report every REPORT_EVERY_DAYS days. The same seed always gives the same data.
+
+The CSV files, the report store, the per-user partitions, the SQLite
+database and the Parquet snapshots (when pyarrow is installed) are all
+written into one directory, so any GLUTENY_STORAGE backend can be pointed
+at it.
+
+Usage:
+    python synth_data.py DIRECTORY --users 100 --days 334 [--seed 0] [--formats csv,partitioned,sqlite,parquet]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import meal_parser
+import parquet_log
+from log_cache import SYMPTOM_COLUMNS, SYMPTOM_LOG_FILE
+from meal_store import MEAL_COLUMNS, MEAL_LOG_FILE
+
+FORMATS = ["csv", "partitioned", "sqlite", "parquet"]
+# Parquet needs pyarrow, which is optional
+DEFAULT_FORMATS = [name for name in FORMATS if name != "parquet" or parquet_log.available()]
+START_DATE = date(2024, 1, 1)
+REPORT_EVERY_DAYS = 90
+# Chance that a meal is followed by a symptom, with and without one of the user's triggers
+TRIGGER_RATE = 0.5
+BASE_RATE = 0.03
+
+# condition -> (trigger foods, symptoms they cause)
+CONDITIONS = {
+    "Gluten intolerant.": (["roti", "bread", "pasta", "naan", "paratha", "biscuits"], ["Bloating", "Brain fog", "Fatigue"]),
+    "Lactose intolerant.": (["paneer", "curd", "milk", "lassi", "cheese"], ["Gas", "Bloating", "Acidity"]),
+    "IBS, sensitive to onion and legumes.": (["rajma", "chole", "onion", "cabbage"], ["Bloating", "Gas"]),
+    "Pre-diabetic, sedentary.": (["rice", "biryani", "juice", "samosa"], ["Fatigue", "Headache"]),
+    "No known conditions.": ([], ["Headache", "Acidity"]),
+}
+FOODS = {
+    "Breakfast": ["oats", "almond milk", "apple", "banana", "poha", "upma", "idlis", "sambar", "dosa", "toast",
+                  "butter", "eggs", "omelette", "tea", "coffee", "paratha", "curd", "milk", "muesli", "bread"],
+    "Lunch": ["rice", "dal", "rotis", "rajma", "chole", "paneer", "salad", "curd", "mixed vegetables", "biryani",
+              "pasta", "sandwich", "khichdi", "raita", "chicken curry", "fish", "onion", "cabbage"],
+    "Dinner": ["rice", "dal", "rotis", "naan", "palak paneer", "grilled chicken", "soup", "quinoa", "salad",
+               "mixed vegetables", "pasta", "chole", "curd", "cheese", "fish", "potato"],
+    "Snack": ["apple", "almonds", "biscuits", "chai", "samosa", "banana", "yogurt", "peanuts", "popcorn",
+              "smoothie", "juice", "lassi", "dhokla"],
+}
+# Meal types by number of meals that day
+DAY_PLANS = {2: ["Breakfast", "Dinner"], 3: ["Breakfast", "Lunch", "Dinner"], 4: ["Breakfast", "Lunch", "Snack", "Dinner"]}
+MEAL_HOURS = {"Breakfast": 8, "Lunch": 13, "Snack": 16, "Dinner": 20}
+LAB_TESTS = [
+    ("Haemoglobin", "g/dL", 11.0, 16.0), ("Ferritin", "ng/mL", 10, 250), ("Vitamin B12", "pg/mL", 150, 900),
+    ("Vitamin D", "ng/mL", 10, 60), ("HbA1c", "%", 4.8, 6.8), ("Fasting glucose", "mg/dL", 75, 130),
+    ("TSH", "mIU/L", 0.5, 5.0), ("Total cholesterol", "mg/dL", 140, 260), ("tTG-IgA", "U/mL", 1, 40),
+]
+
+
+@contextmanager
+def _inside(directory):
+    # Every store uses paths relative to the working directory
+    previous = os.getcwd()
+    os.makedirs(directory, exist_ok=True)
+    os.chdir(directory)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def user_names(count):
+    return [f"User {number:05d}" for number in range(count)]
+
+
+def _profile(rng, condition):
+    height = rng.randint(150, 190)
+    weight = rng.randint(48, 105)
+    return f"{condition}\nHeight: {height} cm\nWeight: {weight} kg\nBMI: {weight / (height / 100) ** 2:.1f}"
+
+
+def _meal(rng, meal_type):
+    foods = rng.sample(FOODS[meal_type], rng.randint(2, 4))
+    # Some meals say how much, the way people type them
+    if rng.random() < 0.3:
+        foods[0] = f"{rng.randint(1, 3)} {foods[0]}"
+    return ", ".join(foods)
+
+
+def _report(rng, user, day):
+    lines = [f"Lab report for {user}", f"Collected: {day.isoformat()}", ""]
+    for test, unit, low, high in LAB_TESTS:
+        value = rng.uniform(low * 0.8, high * 1.1)
+        flag = " (low)" if value < low else " (high)" if value > high else ""
+        lines.append(f"{test}: {value:.1f} {unit}{flag} (reference {low}-{high} {unit})")
+    lines.append("")
+    lines.append(rng.choice([
+        "Impression: mild iron deficiency, dietary review advised.",
+        "Impression: values within normal limits.",
+        "Impression: borderline glycaemic control, follow up in three months.",
+        "Impression: raised tTG-IgA, consistent with coeliac disease; gluten-free diet advised.",
+    ]))
+    return "\n".join(lines)
+
+
+def generate_user(rng, user, condition, days):
+    """(meal rows, symptom rows, reports) for one user over `days` days."""
+    triggers, condition_symptoms = CONDITIONS[condition]
+    triggers = {meal_parser.normalise(food) for food in triggers}
+    meals, symptoms, reports = [], [], []
+    for offset in range(days):
+        day = START_DATE + timedelta(days=offset)
+        for meal_type in DAY_PLANS[rng.choice([2, 3, 3, 3, 4])]:
+            at = datetime.combine(day, datetime.min.time()) + timedelta(hours=MEAL_HOURS[meal_type], minutes=rng.randint(-40, 40))
+            text = _meal(rng, meal_type)
+            ingredients = meal_parser.ingredients(text)
+            triggered = not triggers.isdisjoint(meal_parser.ingredient_names(ingredients))
+            felt = []
+            if rng.random() < (TRIGGER_RATE if triggered else BASE_RATE):
+                felt = rng.sample(condition_symptoms, rng.randint(1, 2))
+            # Half the symptoms are logged with the meal, the rest separately a few hours later
+            logged_with_meal = felt and rng.random() < 0.5
+            meals.append({
+                "timestamp": at.isoformat(timespec="seconds"), "date": day.isoformat(), "name": user, "meal": text,
+                "meal_type": meal_type, "symptoms": ", ".join(felt) if logged_with_meal else "", "notes": "",
+                "ingredients": ingredients,
+            })
+            if felt and not logged_with_meal:
+                later = at + timedelta(hours=rng.randint(1, 4))
+                symptoms.append({
+                    "timestamp": later.isoformat(timespec="seconds"), "date": later.date().isoformat(), "name": user,
+                    "symptoms": ", ".join(felt), "notes": "",
+                })
+        if offset % REPORT_EVERY_DAYS == REPORT_EVERY_DAYS - 1:
+            reports.append(_report(rng, user, day))
+    return meals, symptoms, reports
+
+
+def generate(directory, users, days, seed=0, formats=DEFAULT_FORMATS):
+    """Write `users` x `days` of data into `directory`; returns row and report counts."""
+    from partitioned_log import convert_log, meal_partitions, symptom_partitions
+    from report_store import REPORT_STORE_DIR, ReportStore
+    from storage import USER_FILE, migrate
+
+    rng = random.Random(seed)
+    counts = {"users": users, "days": days, "meal_rows": 0, "symptom_rows": 0, "reports": 0}
+    with _inside(directory):
+        profiles = {}
+        store = ReportStore(REPORT_STORE_DIR)
+        with open(MEAL_LOG_FILE, "w", newline="", encoding="utf-8") as meal_file, \
+                open(SYMPTOM_LOG_FILE, "w", newline="", encoding="utf-8") as symptom_file:
+            meal_writer = csv.DictWriter(meal_file, fieldnames=MEAL_COLUMNS, lineterminator="\n")
+            symptom_writer = csv.DictWriter(symptom_file, fieldnames=SYMPTOM_COLUMNS, lineterminator="\n")
+            meal_writer.writeheader()
+            symptom_writer.writeheader()
+            # One user at a time, so memory stays flat however many users there are
+            for user in user_names(users):
+                condition = rng.choice(list(CONDITIONS))
+                profiles[user] = _profile(rng, condition)
+                meals, symptoms, reports = generate_user(rng, user, condition, days)
+                meal_writer.writerows(meals)
+                symptom_writer.writerows(symptoms)
+                for number, text in enumerate(reports):
+                    store.add_report(user, text, source_hash=f"synthetic-{seed}-{user}-{number}", filename=f"lab_{number}.txt")
+                counts["meal_rows"] += len(meals)
+                counts["symptom_rows"] += len(symptoms)
+                counts["reports"] += len(reports)
+        with open(USER_FILE, "w") as f:
+            json.dump(profiles, f, indent=2)
+
+        if "partitioned" in formats:
+            convert_log(MEAL_LOG_FILE, meal_partitions())
+            convert_log(SYMPTOM_LOG_FILE, symptom_partitions())
+        if "sqlite" in formats:
+            migrate()
+        if "parquet" in formats:
+            parquet_log.convert_log(MEAL_LOG_FILE, parquet_log.meal_snapshots())
+            parquet_log.convert_log(SYMPTOM_LOG_FILE, parquet_log.symptom_snapshots())
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write seeded synthetic Gluteny data into a directory.")
+    parser.add_argument("directory")
+    parser.add_argument("--users", type=int, required=True)
+    parser.add_argument("--days", type=int, required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--formats", default=",".join(DEFAULT_FORMATS), help="comma-separated, from " + ", ".join(FORMATS))
+    args = parser.parse_args()
+    if os.path.exists(args.directory) and os.listdir(args.directory):
+        sys.exit(f"{args.directory} is not empty")
+    counts = generate(args.directory, args.users, args.days, args.seed, args.formats.split(","))
+    print(json.dumps(counts))
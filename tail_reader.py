@@ -0,0 +1,33 @@
+# tail_reader.py
+import os
+
+BLOCK_SIZE = 8192
+
+
+def read_last_lines(path, n=10, block_size=BLOCK_SIZE):
+    """Return the last `n` non-blank lines of a text file, oldest first.
+
+    Reads backwards from the end in fixed-size blocks, so the cost depends on
+    how far back those lines are, not on the size of the file.
+    """
+    found = []
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        partial = b""
+        while pos > 0 and len(found) < n:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            parts = (f.read(step) + partial).split(b"\n")
+            # The first piece may continue in the previous block
+            partial = parts.pop(0)
+            for line in reversed(parts):
+                if line.strip():
+                    found.append(line)
+                    if len(found) == n:
+                        break
+        if pos == 0 and len(found) < n and partial.strip():
+            found.append(partial)
+
+    return [line.decode("utf-8", errors="replace").rstrip("\r") + "\n" for line in reversed(found)]
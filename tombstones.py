@@ -0,0 +1,50 @@
+# tombstones.py
+"""Deleted users and when they were deleted.
+
+Rows a user logged up to their deletion time are hidden from every read
+until compaction (user_deletion.compact) removes them for good. Rows logged
+later, e.g. after a user of the same name is added again, stay visible.
+"""
+from datetime import datetime
+
+from meal_store import atomic_write_json, load_cached, locked
+
+TOMBSTONE_FILE = "deleted_users.json"
+
+# path -> ((mtime_ns, size), {user: deleted_at})
+_cache = {}
+
+
+def load():
+    """{user: deleted_at ISO timestamp} for every user awaiting compaction."""
+    try:
+        return load_cached(TOMBSTONE_FILE, _cache)
+    except FileNotFoundError:
+        return {}
+
+
+def _save(tombstones):
+    atomic_write_json(TOMBSTONE_FILE, tombstones)
+
+
+def add(user):
+    """Record that `user` was deleted now; returns the deletion timestamp."""
+    deleted_at = datetime.now().isoformat(timespec="seconds")
+    with locked(TOMBSTONE_FILE):
+        tombstones = dict(load())
+        tombstones[user] = deleted_at
+        _save(tombstones)
+    return deleted_at
+
+
+def discard(compacted):
+    """Drop tombstones whose rows are gone, unless the user was deleted again meanwhile."""
+    with locked(TOMBSTONE_FILE):
+        tombstones = {user: at for user, at in load().items() if compacted.get(user) != at}
+        _save(tombstones)
+
+
+def hidden(user, timestamp):
+    """True if a row `user` logged at `timestamp` belongs to a deleted user."""
+    deleted_at = load().get(user)
+    return deleted_at is not None and (timestamp or "") <= deleted_at
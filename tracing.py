@@ -0,0 +1,215 @@
+# tracing.py
+"""Timing spans for each rerun of the Streamlit scripts.
+
+    with span("coach", user=user) as s:
+        ...
+        s.set(prompt_tokens=812)
+
+    @traced("insights.correlate")
+    def correlate(...): ...
+
+Each span is one JSON line in TRACE_FILE with its name, duration in ms, the
+span it ran inside and any attributes set on it, such as token counts.
+start_rerun() at the top of a script gives every span of that rerun the
+same trace id, and end_rerun() adds a "rerun" span for the whole run, so a
+slow chat turn can be split into log loading, insights, the OpenAI call
+and rendering.
+
+Tracing is off unless GLUTENY_TRACE=1, and set_enabled() switches it for
+the whole process while it runs (the sidebar has a checkbox for it). When
+it is off, span() hands back one shared do-nothing object, so the
+instrumented code pays for a function call and a flag check.
+
+Spans are buffered and written when the outermost span of a thread ends,
+so a rerun costs a few appends to the file, not one per span.
+
+Usage:
+    python tracing.py summary [gluteny_traces.jsonl]
+"""
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+
+TRACE_FILE = os.getenv("GLUTENY_TRACE_FILE", "gluteny_traces.jsonl")
+
+_enabled = os.getenv("GLUTENY_TRACE", "0") == "1"
+_buffer = deque()
+_write_lock = threading.Lock()
+# (trace id, page, user, wall-clock start, perf_counter start) of this thread's rerun, and its innermost open span
+_rerun = contextvars.ContextVar("gluteny_rerun", default=None)
+_current = contextvars.ContextVar("gluteny_span", default=None)
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(flag):
+    """Turn tracing on or off for the whole process."""
+    global _enabled
+    _enabled = bool(flag)
+    if not _enabled:
+        flush()
+
+
+def _new_id():
+    return uuid.uuid4().hex[:16]
+
+
+class _NoSpan:
+    """What span() returns while tracing is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Span:
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.id = _new_id()
+
+    def set(self, **attrs):
+        """Add attributes, e.g. token or row counts, to the span."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.parent = _current.get()
+        self._token = _current.set(self.id)
+        self.started = time.time()
+        self._clock = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ms = (time.perf_counter() - self._clock) * 1000
+        _current.reset(self._token)
+        rerun = _rerun.get()
+        trace_id = rerun[0] if rerun else None
+        record = {
+            # Outermost spans of a rerun hang off its "rerun" span, whose id is the trace id
+            "trace": trace_id, "span": self.id, "parent": self.parent or trace_id, "name": self.name,
+            "start": round(self.started, 6), "ms": round(ms, 3), **self.attrs,
+        }
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        _buffer.append(record)
+        if self.parent is None:
+            flush()
+        return False
+
+
+def span(name, **attrs):
+    """Context manager timing the code inside it as span `name`."""
+    if not _enabled:
+        return _NO_SPAN
+    return Span(name, attrs)
+
+
+def traced(name=None):
+    """Decorator form of span(); the span is named after the function unless `name` is given."""
+    def decorate(func):
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def start_rerun(page, user=None):
+    """Mark the start of a script rerun; spans until end_rerun() share its trace id."""
+    _rerun.set((_new_id(), page, user, time.time(), time.perf_counter()) if _enabled else None)
+
+
+def end_rerun(**attrs):
+    """Write the "rerun" span covering everything since start_rerun()."""
+    rerun = _rerun.get()
+    if rerun is None or not _enabled:
+        return
+    trace_id, page, user, started, clock = rerun
+    _buffer.append({
+        "trace": trace_id, "span": trace_id, "parent": None, "name": "rerun", "start": round(started, 6),
+        "ms": round((time.perf_counter() - clock) * 1000, 3), "page": page, "user": user, **attrs,
+    })
+    _rerun.set(None)
+    flush()
+
+
+def flush(path=None):
+    """Append buffered spans to the trace file."""
+    spans = []
+    # deque pops are atomic, so spans other threads finish meanwhile wait for the next flush
+    while _buffer:
+        try:
+            spans.append(_buffer.popleft())
+        except IndexError:
+            break
+    if not spans:
+        return
+    lines = "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in spans)
+    with _write_lock, open(path or TRACE_FILE, "a", encoding="utf-8") as f:
+        f.write(lines)
+
+
+def read(path=TRACE_FILE):
+    """Every span in a trace file; torn or foreign lines are skipped."""
+    spans = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and "name" in record and "ms" in record:
+                    spans.append(record)
+    except FileNotFoundError:
+        pass
+    return spans
+
+
+def summary(spans):
+    """[(name, count, median ms, p95 ms, total ms, tokens)] per span name, slowest total first."""
+    by_name = {}
+    for record in spans:
+        by_name.setdefault(record["name"], []).append(record)
+    rows = []
+    for name, records in by_name.items():
+        times = sorted(record["ms"] for record in records)
+        tokens = sum(record.get("prompt_tokens", 0) + record.get("completion_tokens", 0) for record in records)
+        rows.append((name, len(times), times[len(times) // 2], times[min(len(times) - 1, int(0.95 * len(times)))],
+                     sum(times), tokens))
+    return sorted(rows, key=lambda row: row[4], reverse=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "summary":
+        print(__doc__)
+        sys.exit(1)
+    path = sys.argv[2] if len(sys.argv) > 2 else TRACE_FILE
+    rows = summary(read(path))
+    if not rows:
+        sys.exit(f"No spans in {path}")
+    width = max(len(row[0]) for row in rows)
+    print(f"{'span':<{width}}  {'count':>6}  {'median ms':>10}  {'p95 ms':>10}  {'total ms':>10}  {'tokens':>8}")
+    for name, count, median, p95, total, tokens in rows:
+        print(f"{name:<{width}}  {count:>6}  {median:>10.1f}  {p95:>10.1f}  {total:>10.1f}  {tokens:>8}")
@@ -0,0 +1,93 @@
+# user_deletion.py
+"""Delete a user from every store their data lives in.
+
+delete_user() only does work proportional to that user's data: the profile,
+their reports, their insight counters and cached replies are removed
+directly, and a tombstone hides their rows in the shared logs at once.
+Rewriting the shared CSV logs and pruning the report search index is left
+to compact(), which runs on a background thread after each deletion.
+
+The legacy report_memory.txt is shared by everyone and not tagged by user,
+so it cannot be split per user and is left alone.
+
+Usage:
+    python user_deletion.py compact
+"""
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import tombstones
+from insight_store import forget_user as forget_insights
+from prompt_budget import drop_usage
+from report_index import get_index
+from response_cache import get_cache
+from storage import compact_logs, delete_user_profile, delete_user_rows, report_store
+
+# One worker, so compactions never overlap
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gluteny-compact")
+_pending = None
+_pending_lock = threading.Lock()
+
+
+def delete_user(name):
+    """Delete `name` and everything they logged or uploaded; returns the deletion timestamp."""
+    # The tombstone goes first so every read hides the user's rows from here on
+    deleted_at = tombstones.add(name)
+    delete_user_profile(name)
+    delete_user_rows(name, deleted_at)
+    report_store().forget_user(name, deleted_at)
+    forget_insights(name)
+    get_cache().forget_user(name)
+    schedule_compaction()
+    return deleted_at
+
+
+def compact():
+    """Physically remove everything hidden by tombstones; returns a summary per store."""
+    deleted = dict(tombstones.load())
+    if not deleted:
+        return {}
+
+    store = report_store()
+    # Reports are blanked at deletion time; their chunks are dropped from the search index here
+    scrubbed = [
+        chunk_no
+        for meta in store.all_reports() if meta["user"] is None
+        for chunk_no in range(meta["first_chunk"], meta["first_chunk"] + meta["chunk_count"])
+    ]
+    index = get_index()
+    index_chunks = index.forget(scrubbed)
+    if index_chunks:
+        index.save()
+
+    summary = {
+        "users": len(deleted),
+        "log_rows": compact_logs(deleted),
+        "index_chunks": index_chunks,
+        "usage_entries": drop_usage(deleted),
+    }
+    tombstones.discard(deleted)
+    return summary
+
+
+def _compact_until_clean():
+    # Users deleted while a pass was running get their own pass
+    while tombstones.load():
+        compact()
+
+
+def schedule_compaction():
+    global _pending
+    with _pending_lock:
+        if _pending is None or _pending.done():
+            _pending = _executor.submit(_compact_until_clean)
+        return _pending
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "compact":
+        print(__doc__)
+        sys.exit(1)
+    summary = compact()
+    print(f"Compacted {summary.get('users', 0)} deleted user(s): {summary}")
@@ -1,85 +1,80 @@
 # utils.py
-import os
-import pandas as pd
-import json
-from datetime import datetime
+from datetime import datetime, date
+from storage import meal_log, symptom_log
+from symptom_insights import correlate, insight_text
+from insight_store import insight_text as stored_insight
+from report_index import report_context
+from tracing import traced
 
 
-USER_FILE = "user_profiles.json"
-MEAL_LOG_FILE = "meal_log.csv"
-SYMPTOM_LOG_FILE = "symptom_log.csv"
-REPORT_FILE = "report_memory.txt"
+# --- Helper: Load meals + reports for memory ---
+@traced("context.memory")
+def get_memory_context(user, query=None):
+    memory = ""
 
-def load_user_profiles():
-    if os.path.exists(USER_FILE):
-        with open(USER_FILE, "r") as f:
-            return json.load(f)
-    return {}
+    user_logs = meal_log().recent(user, 5)
 
-def save_user_profiles(profiles):
-    with open(USER_FILE, "w") as f:
-        json.dump(profiles, f)
+    if not user_logs.empty:
+        latest_logs = user_logs.iloc[::-1]
 
-def get_memory_context(user):
-    memory = ""
-    if os.path.exists(MEAL_LOG_FILE):
+        memory += f"Here are the last 5 meals logged by {user}:\n"
+        for row in latest_logs.itertuples(index=False):
+            meal_info = f"- {row.date}: {row.meal_type} – {row.meal}"
+            memory += meal_info + "\n"
+
+    memory += report_context(user, query=query)
+
+    return memory.strip()
+
+
+@traced("context.meals_by_date")
+def get_meal_by_date(user, target_date_str):
+    """Search meal log for a specific date (e.g., '31 March' or '2025-03-31')"""
+    if meal_log().empty:
+        return None
+
+    try:
         try:
-            df = pd.read_csv(MEAL_LOG_FILE)
-            user_logs = df[df["name"] == user].tail(5)
-            if not user_logs.empty:
-                memory += f"Recent meals for {user}:\n"
-                for _, row in user_logs.iterrows():
-                    memory += f"- {row['meal_type']}: {row['meal']} on {row['timestamp']}\n"
-        except pd.errors.EmptyDataError:
-            memory += "\n(Meal log exists but is empty)\n"
-    if os.path.exists(REPORT_FILE):
-        with open(REPORT_FILE, "r") as f:
-            lines = f.readlines()[-10:]
-            memory += "\nReport Summary (latest 10 lines):\n" + "".join(lines)
-    return memory
-
-def calculate_nutritional_score(meal):
-    calories = 200  # Placeholder
-    protein = 15
-    fat = 10
-    carbs = 30
-    score = 100 - abs(50 - protein) - abs(50 - carbs) - abs(50 - fat)
-    return score
-
-def get_meal_symptom_insight(user):
-    if not os.path.exists(MEAL_LOG_FILE) or not os.path.exists(SYMPTOM_LOG_FILE):
+            if not target_date_str.strip().startswith("202"):
+                target_date = datetime.strptime(target_date_str.strip(), "%d %B").replace(year=date.today().year)
+            else:
+                target_date = datetime.strptime(target_date_str.strip(), "%Y-%m-%d")
+        except ValueError:
+            return None
+
+        date_str = target_date.strftime("%Y-%m-%d")
+        matching = meal_log().on_date(user, date_str)
+        if matching.empty:
+            return None
+
+        result = f"Meals logged on {date_str}:\n"
+        for row in matching.itertuples(index=False):
+            result += f"- {row.meal_type}: {row.meal}\n"
+        return result.strip()
+
+    except Exception as e:
+        return f"Error checking date-based meals: {e}"
+
+
+@traced("context.symptom_insight")
+def get_meal_symptom_insight(user, window_hours=None):
+    if meal_log().empty:
         return "Not enough data yet to analyze meal and symptom correlations."
 
     try:
-        meals = pd.read_csv(MEAL_LOG_FILE)
-        symptoms = pd.read_csv(SYMPTOM_LOG_FILE)
-
-        meals = meals[meals["name"] == user]
-        symptoms = symptoms[symptoms["name"] == user]
+        if window_hours is None:
+            insight = stored_insight(user)
+            if insight is not None:
+                return insight or "No overlapping meal and symptom data found yet."
 
-        combined = pd.merge(meals, symptoms, on="date", how="inner")
+        meals = meal_log().for_user(user)
+        symptoms = symptom_log().for_user(user)
 
-        if combined.empty:
+        stats = correlate(meals, symptoms, window_hours=window_hours)
+        if stats.empty:
             return "No overlapping meal and symptom data found yet."
 
-        symptom_counts = {}
-        for _, row in combined.iterrows():
-            meal = row["meal"].lower()
-            symptom_list = row["symptoms"].split(", ")
-            for symptom in symptom_list:
-                if symptom not in symptom_counts:
-                    symptom_counts[symptom] = []
-                symptom_counts[symptom].append(meal)
-
-        insight = ""
-        for symptom, meals_triggered in symptom_counts.items():
-            meal_summary = pd.Series(meals_triggered).value_counts().head(2)
-            insight += f"🔁 **{symptom}** has occurred after meals like:\n"
-            for meal, count in meal_summary.items():
-                insight += f"• {meal} ({count} times)\n"
-            insight += "\n"
-
-        return insight.strip()
+        return insight_text(stats)
 
     except Exception as e:
         return f"Error analyzing symptom insight: {e}"